@@ -2,16 +2,25 @@ from functools import wraps
 import datetime
 import logging
 import os
+import threading
 
 from dotenv import load_dotenv
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_restful import Api, Resource, abort
 
-from plankton.conversational_agent import ChatbotManager
 from plankton.database import Database
-from plankton.embed_data import embed_data, get_embeddings
+from plankton.source_index import parse_filter
+from plankton.tracing import (
+    METRICS,
+    TRACE_HEADER,
+    current_trace_id,
+    end_trace,
+    span,
+    start_trace,
+    valid_trace_id,
+)
 
 app = Flask(__name__)
 
@@ -38,6 +47,37 @@ load_dotenv(dotenv_path)
 Database.initialize()
 
 
+@app.before_request
+def begin_request_trace():
+    """
+    Start a trace for every request, reusing the trace ID sent by the caller
+    when it is well formed and generating a new one otherwise
+    """
+    start_trace(valid_trace_id(request.headers.get(TRACE_HEADER)))
+
+
+@app.after_request
+def finish_request_trace(response):
+    """
+    Return the trace ID to the caller and log the span timings of the request
+    """
+    trace = end_trace()
+    if trace is not None:
+        response.headers[TRACE_HEADER] = trace.trace_id
+        if request.path != "/metrics":
+            logger.info(f"Trace {request.method} {request.path}: {trace.summary()}")
+    return response
+
+
+@app.route("/metrics")
+@limiter.exempt
+def metrics():
+    """
+    Expose stage latencies, token counts, retries and route metrics for Prometheus
+    """
+    return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
+
+
 def token_required(f):
     """
     Decorator function to require an API token for certain routes
@@ -59,6 +99,42 @@ def token_required(f):
     return decorated
 
 
+def answer_question(question, metadata_filter=None):
+    """
+    Build the agent over the served vector store and answer a question,
+    optionally searching only the chunks matching a metadata filter.
+    langchain and chromadb are imported here, on the first question, so the
+    service starts without loading them.
+    """
+    from plankton.conversational_agent import ChatbotManager
+    from plankton.embed_data import get_embeddings, get_serving_vector_store
+
+    embed = get_embeddings()
+
+    # Reopened only when a rebuild or rollback moved the active index version
+    vectorstore = get_serving_vector_store(embed)
+
+    chatbotManager = ChatbotManager(vectorstore, metadata_filter=metadata_filter)
+    agent = chatbotManager.initialize_agent()
+    logger.info(f'Agent question: "{question}"')
+    with span("agent"):
+        return agent(question)
+
+
+def warm_up():
+    """
+    Import the agent stack and load the tokenizer in the background, so the
+    first question does not pay for it and startup does not wait for it
+    """
+    with span("warm_up"):
+        import plankton.conversational_agent  # noqa: F401
+        import plankton.embed_data  # noqa: F401
+        from plankton.data_processing import get_tokenizer
+
+        get_tokenizer()
+    logger.info("Agent stack loaded")
+
+
 def transform_id(user):
     """
     Helper function to transform the '_id' field of a user object to a string
@@ -87,18 +163,17 @@ class Ask(Resource):
         user_id = data.get("user_id")
         question = data.get("question")
 
+        # Optional metadata filter, e.g. {"source_prefix": "https://mof.gov.ae/en/tax"}
+        try:
+            metadata_filter = parse_filter(data.get("filter"))
+        except ValueError as e:
+            abort(400, message=str(e))
+
         user = Database.find("users", {"user_id": user_id})
         if len(list(user)) == 0:
             abort(400, message=f"User with ID {user_id} does not exist")
 
-        embed = get_embeddings()
-
-        vectorstore = embed_data(docs=None, embedding=embed)
-
-        chatbotManager = ChatbotManager(vectorstore)
-        agent = chatbotManager.initialize_agent()
-        logger.info(f'Agent question: "{question}"')
-        response = agent(question)
+        response = answer_question(question, metadata_filter)
 
         # Preparing data for insertion
         insert_data = {
@@ -106,6 +181,7 @@ class Ask(Resource):
             "response": response,
             "user_id": user_id,
             "date": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "trace_id": current_trace_id(),
         }
 
         # Inserting data into the database
@@ -179,14 +255,7 @@ class Telegram(Resource):
             )
 
         question = data.get("question")
-        embed = get_embeddings()
-
-        vectorstore = embed_data(docs=None, embedding=embed)
-        chatbotManager = ChatbotManager(vectorstore)
-        agent = chatbotManager.initialize_agent()
-
-        logger.info(f'Agent question: "{question}"')
-        response = agent(question)
+        response = answer_question(question)
 
         # Preparing data for insertion
         insert_data = {
@@ -197,6 +266,7 @@ class Telegram(Resource):
             "user_name": data.get("user_name"),
             "first_name": data.get("first_name"),
             "last_name": data.get("last_name"),
+            "trace_id": current_trace_id(),
         }
         # Inserting data into the database
         Database.insert("query", insert_data)
@@ -327,5 +397,12 @@ api.add_resource(Telegram, "/telegram/ask")
 api.add_resource(Review, "/review")
 
 if __name__ == "__main__":
+    debug = True
+
+    # In debug mode the reloader runs this module twice, warm up only the
+    # child process that serves requests
+    if not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        threading.Thread(target=warm_up, daemon=True).start()
+
     # Start the Flask app
-    app.run(host="0.0.0.0", port=os.environ.get("FLASK_SERVER_PORT", 9090), debug=True)
+    app.run(host="0.0.0.0", port=os.environ.get("FLASK_SERVER_PORT", 9090), debug=debug)
@@ -0,0 +1,262 @@
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import click
+
+from plankton.conversational_agent import ChatbotManager
+from plankton.corpus import CorpusReader
+from plankton.data_processing import get_docs, split_documents
+from plankton.dedup import remove_duplicates, strip_boilerplate
+from plankton.embed_data import embed_data
+from plankton.fakes import HashEmbeddings, StubChatModel
+from plankton.retrieval import RETRIEVAL_CACHE, PlanktonRetriever
+from plankton.routing import FAST_ROUTE, ROUTE_METRICS
+from plankton.tracing import METRICS
+
+# Set up logging with time
+logging.basicConfig(
+    format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+# The cl100k_base encoding is vendored here (named the way tiktoken caches it)
+# so splitting and token counting never download it
+TIKTOKEN_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "benchmarks", "tiktoken"
+)
+os.environ["TIKTOKEN_CACHE_DIR"] = TIKTOKEN_DIR
+
+# Hash embeddings score far below ada-002, this threshold splits the fixture
+# questions between the fast and the strong route so both are exercised
+OFFLINE_MIN_RELEVANCE = 0.25
+
+
+class OfflineChatbotManager(ChatbotManager):
+    """ChatbotManager that answers with the stub chat model instead of OpenAI"""
+
+    def __init__(self, vectorstore, metadata_filter=None):
+        super().__init__(vectorstore, metadata_filter)
+        self.agent_verbose = False
+        self.min_relevance = OFFLINE_MIN_RELEVANCE
+
+    def _initialize_llm(self, model_name=None, stage="llm", route=None):
+        return StubChatModel(
+            model_name=model_name or self.model_name,
+            callbacks=self._llm_callbacks(stage, route),
+        )
+
+
+def load_questions(path):
+    """return the question records of a jsonl file"""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentiles(values):
+    """return the p50, p90 and p99 of a list of latencies in milliseconds"""
+    if not values:
+        return {"p50": 0.0, "p90": 0.0, "p99": 0.0}
+    if len(values) == 1:
+        return {key: round(values[0] * 1000, 3) for key in ("p50", "p90", "p99")}
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {
+        "p50": round(cuts[49] * 1000, 3),
+        "p90": round(cuts[89] * 1000, 3),
+        "p99": round(cuts[98] * 1000, 3),
+    }
+
+
+def recall_at_k(retrieved_ids, expected_ids):
+    expected = set(expected_ids)
+    if not expected:
+        return 1.0
+    return len(expected & set(retrieved_ids)) / len(expected)
+
+
+def prompt_tokens():
+    return sum(
+        value
+        for event, value in METRICS.counters().items()
+        if event.endswith("_prompt_tokens")
+    )
+
+
+def load_chunks(data_dir, corpus):
+    """
+    return the documents, chunks and dedup report of the benchmark corpus.
+    Chunks loaded from a corpus artifact come without documents or dedup report.
+    """
+    if corpus:
+        # Already parsed, deduplicated and split by main.py --save-corpus
+        with CorpusReader(corpus) as reader:
+            return None, list(reader), None
+
+    docs = get_docs(data_dir)
+    pages, boilerplate = strip_boilerplate(docs)
+    chunks, duplicates = remove_duplicates(split_documents(pages))
+    return docs, chunks, {**boilerplate, **duplicates}
+
+
+def run_benchmark(data_dir, questions_path, persist_directory, corpus=None):
+    report = {}
+
+    # Ingest: parse, deduplicate, split and index the fixture corpus
+    start = time.perf_counter()
+    docs, chunks, dedup = load_chunks(data_dir, corpus)
+    split_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectorstore = embed_data(
+        embedding=HashEmbeddings(),
+        docs=chunks,
+        persist_directory=persist_directory,
+        delete_existing_db=True,
+    )
+    index_seconds = time.perf_counter() - start
+
+    if corpus:
+        # Nothing is parsed or split, only the memory mapped artifact is read
+        report["ingest"] = {
+            "chunks": len(chunks),
+            "corpus_load_chunks_per_second": round(len(chunks) / split_seconds, 2),
+        }
+    else:
+        report["ingest"] = {
+            "documents": len(docs),
+            "chunks": len(chunks),
+            "dedup": dedup,
+            "parse_dedup_split_docs_per_second": round(len(docs) / split_seconds, 2),
+        }
+    report["ingest"]["index_chunks_per_second"] = round(len(chunks) / index_seconds, 2)
+
+    questions = load_questions(questions_path)
+    manager = OfflineChatbotManager(vectorstore)
+
+    # Retrieval: latency and recall@k of the plain vector search, cold cache
+    RETRIEVAL_CACHE.reset()
+    retriever = PlanktonRetriever(
+        vectorstore=vectorstore,
+        search_type=manager.search_type,
+        search_kwargs=manager.search_kwargs,
+    )
+    latencies, recalls = [], []
+    for record in questions:
+        start = time.perf_counter()
+        found = retriever.get_relevant_documents(record["question"])
+        latencies.append(time.perf_counter() - start)
+        recalls.append(
+            recall_at_k(
+                [doc.metadata.get("id") for doc in found],
+                record.get("expected_ids", []),
+            )
+        )
+
+    report["retrieval"] = {
+        "k": manager.search_kwargs["k"],
+        "search_type": manager.search_type,
+        "latency_ms": percentiles(latencies),
+        "recall_at_k": round(sum(recalls) / len(recalls), 4) if recalls else 0.0,
+        "retrieval_cache_hit_rate": round(RETRIEVAL_CACHE.hit_rate(), 4),
+    }
+
+    # End to end: replay every question through a fresh agent, like app.py does.
+    # The cache is reset so the retrieval phase does not warm it for the agents
+    RETRIEVAL_CACHE.reset()
+    tokens_before = prompt_tokens()
+    latencies = []
+    for record in questions:
+        agent = OfflineChatbotManager(vectorstore).initialize_agent()
+        start = time.perf_counter()
+        agent(record["question"])
+        latencies.append(time.perf_counter() - start)
+
+    report["agent"] = {
+        "questions": len(questions),
+        "latency_ms": percentiles(latencies),
+        "prompt_tokens": prompt_tokens() - tokens_before,
+        "retrieval_cache_hit_rate": round(RETRIEVAL_CACHE.hit_rate(), 4),
+        "routes": ROUTE_METRICS.snapshot(),
+    }
+    return report
+
+
+def compare_to_baseline(report, baseline, tolerance):
+    """return the regressions of the report against a previous report"""
+    regressions = []
+    recall = report["retrieval"]["recall_at_k"]
+    baseline_recall = baseline["retrieval"]["recall_at_k"]
+    if recall < baseline_recall - tolerance:
+        regressions.append(f"recall@k dropped from {baseline_recall} to {recall}")
+
+    tokens = report["agent"]["prompt_tokens"]
+    baseline_tokens = baseline["agent"]["prompt_tokens"]
+    if tokens > baseline_tokens * (1 + tolerance):
+        regressions.append(f"prompt tokens grew from {baseline_tokens} to {tokens}")
+
+    fast = route_calls(report, FAST_ROUTE)
+    baseline_fast = route_calls(baseline, FAST_ROUTE)
+    if fast < baseline_fast * (1 - tolerance):
+        regressions.append(f"fast route answers dropped from {baseline_fast} to {fast}")
+    return regressions
+
+
+def route_calls(report, route):
+    return report["agent"]["routes"].get(route, {}).get("calls", 0)
+
+
+@click.command()
+@click.option(
+    "--data-dir",
+    default="./benchmarks/fixtures/corpus",
+    help="Directory of the fixture corpus.",
+)
+@click.option(
+    "--questions",
+    default="./benchmarks/fixtures/questions.jsonl",
+    help="JSONL file of questions with their expected document ids.",
+)
+@click.option(
+    "--corpus",
+    default=None,
+    help="Load split chunks from this corpus artifact instead of data-dir.",
+)
+@click.option("--output", default=None, help="Write the report to this JSON file.")
+@click.option(
+    "--baseline", default=None, help="Fail if the report regresses against this one."
+)
+@click.option(
+    "--tolerance",
+    default=0.05,
+    help="Allowed relative regression against the baseline.",
+)
+@click.option("--min-recall", default=0.0, help="Fail if recall@k is below this.")
+def main(data_dir, questions, corpus, output, baseline, tolerance, min_recall):
+    with tempfile.TemporaryDirectory() as persist_directory:
+        report = run_benchmark(data_dir, questions, persist_directory, corpus)
+
+    logger.info(f"Benchmark report:\n{json.dumps(report, indent=2)}")
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    regressions = []
+    if report["retrieval"]["recall_at_k"] < min_recall:
+        regressions.append(
+            f"recall@k {report['retrieval']['recall_at_k']} is below {min_recall}"
+        )
+    if baseline:
+        with open(baseline) as f:
+            regressions += compare_to_baseline(report, json.load(f), tolerance)
+
+    for regression in regressions:
+        logger.error(f"Regression: {regression}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
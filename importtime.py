@@ -0,0 +1,67 @@
+import logging
+import subprocess
+import sys
+import time
+
+import click
+
+# Set up logging with time
+logging.basicConfig(
+    format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+
+def profile_import(module):
+    """
+    Import a module in a fresh interpreter with -X importtime and return the
+    wall time and the (cumulative microseconds, package) of every import
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    wall_time = time.perf_counter() - start
+    if result.returncode != 0:
+        raise click.ClickException(f"Importing {module} failed:\n{result.stderr}")
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, package = line[len("import time:") :].split("|")
+        imports.append((int(cumulative), package.rstrip()))
+    return wall_time, imports
+
+
+@click.command()
+@click.option(
+    "--module",
+    "modules",
+    multiple=True,
+    default=["app", "main", "telebot"],
+    help="Entry point module to profile, can be repeated.",
+)
+@click.option("--top", default=15, help="Number of slowest imports to report.")
+def main(modules, top):
+    for module in modules:
+        wall_time, imports = profile_import(module)
+        # Direct imports of the module, deeper ones are indented further
+        direct = [
+            (cumulative, package)
+            for cumulative, package in imports
+            if len(package) - len(package.lstrip()) == 3
+        ]
+        direct.sort(reverse=True)
+        total = max((cumulative for cumulative, _ in imports), default=0)
+
+        lines = [f"{module}: {wall_time:.3f}s cold start, {total / 1e6:.3f}s importing"]
+        for cumulative, package in direct[:top]:
+            lines.append(f"  {cumulative / 1e6:8.3f}s  {package.strip()}")
+        logger.info("\n".join(lines))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import os
+import random
+import statistics
+import threading
+import time
+import uuid
+
+import click
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from plankton.data_processing import get_tokenizer
+from plankton.fakes import HashEmbeddings, stub_reply
+
+# Set up logging with time
+logging.basicConfig(
+    format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+# Define the path to the .env file
+dotenv_path = os.path.join(".env")
+
+# Load the .env file
+load_dotenv(dotenv_path)
+
+# Same size as text-embedding-ada-002 vectors, the dimension Chroma checks queries against
+EMBEDDING_SIZE = 1536
+
+# Upper bounds (milliseconds) of the latency histogram buckets
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    """
+    Minimal OpenAI compatible API serving /v1/chat/completions and /v1/embeddings
+    from plankton.fakes, so the backend can be load tested without OpenAI.
+    The index the backend serves must be built through the stub as well, so
+    query and document vectors come from the same embedder.
+    """
+
+    embeddings = HashEmbeddings(size=EMBEDDING_SIZE)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, body):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        data = json.loads(self.rfile.read(length) or b"{}")
+
+        if self.path.endswith("/chat/completions"):
+            content = stub_reply([m["content"] for m in data.get("messages", [])])
+            self._reply(
+                {
+                    "id": f"chatcmpl-{uuid.uuid4().hex}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": data.get("model"),
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": content},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": {
+                        "prompt_tokens": 0,
+                        "completion_tokens": 0,
+                        "total_tokens": 0,
+                    },
+                }
+            )
+        elif self.path.endswith("/embeddings"):
+            inputs = data.get("input", [])
+            if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+                inputs = [inputs]
+            # langchain sends documents as cl100k token ids and queries as text,
+            # decode the ids so both are hashed from the same words
+            texts = [
+                item if isinstance(item, str) else get_tokenizer().decode(item)
+                for item in inputs
+            ]
+            self._reply(
+                {
+                    "object": "list",
+                    "model": data.get("model"),
+                    "data": [
+                        {"object": "embedding", "index": i, "embedding": vector}
+                        for i, vector in enumerate(
+                            self.embeddings.embed_documents(texts)
+                        )
+                    ],
+                    "usage": {"prompt_tokens": 0, "total_tokens": 0},
+                }
+            )
+        else:
+            self.send_error(404)
+
+
+def load_questions(questions_path, mongo_uri, limit):
+    """
+    return the questions to replay, either from a JSONL file or from the
+    logged 'query' collection in Mongo
+    """
+    if questions_path:
+        with open(questions_path) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        questions = [
+            record.get("question") or record.get("body") or record.get("title")
+            for record in records
+        ]
+    else:
+        from plankton.database import Database
+
+        Database.URI = mongo_uri
+        Database.initialize()
+        questions = [record["question"] for record in Database.find("query", {})]
+
+    questions = [question for question in questions if question]
+    return questions[:limit] if limit else questions
+
+
+def build_request(endpoint, question, user):
+    """return the path and JSON body for one replayed question"""
+    if endpoint == "ask":
+        return "/ask", {"question": question, "user_id": user["user_id"]}
+    return "/telegram/ask", {"question": question, **user}
+
+
+class LoadReport:
+    """Thread safe collection of request outcomes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+
+    def record(self, latency, status):
+        with self._lock:
+            self.latencies.append(latency)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            if status != 200:
+                self.errors += 1
+
+    def summary(self, elapsed) -> dict:
+        total = len(self.latencies)
+        latencies_ms = sorted(latency * 1000 for latency in self.latencies)
+
+        histogram = {}
+        for bound in LATENCY_BUCKETS_MS:
+            histogram[f"<={bound}"] = sum(1 for ms in latencies_ms if ms <= bound)
+        histogram["+Inf"] = total
+
+        if len(latencies_ms) > 1:
+            cuts = statistics.quantiles(latencies_ms, n=100, method="inclusive")
+            percentiles = {"p50": cuts[49], "p90": cuts[89], "p99": cuts[98]}
+        else:
+            percentiles = {key: sum(latencies_ms) for key in ("p50", "p90", "p99")}
+
+        return {
+            "requests": total,
+            "elapsed_seconds": round(elapsed, 3),
+            "throughput_rps": round(total / elapsed, 3) if elapsed else 0.0,
+            "latency_ms": {key: round(value, 3) for key, value in percentiles.items()},
+            "latency_histogram_ms": histogram,
+            "status_codes": {str(key): value for key, value in self.statuses.items()},
+            "error_rate": round(self.errors / total, 4) if total else 0.0,
+            "rate_limited": self.statuses.get(429, 0),
+        }
+
+
+def send(session, url, body, token, scheduled, report):
+    """post one question and record its latency, measured from its scheduled time"""
+    try:
+        response = session.post(
+            url,
+            json=body,
+            headers={"X-API-KEY": token, "X-Trace-Id": uuid.uuid4().hex},
+            timeout=300,
+        )
+        status = response.status_code
+    except requests.RequestException as e:
+        logger.warning(f"Request failed: {e}")
+        status = "connection_error"
+    report.record(time.perf_counter() - scheduled, status)
+
+
+@click.group()
+def cli():
+    pass
+
+
+@cli.command()
+@click.option("--host", default="127.0.0.1", help="Host to bind the stub server to.")
+@click.option("--port", default=8000, help="Port to bind the stub server to.")
+def stubs(host, port):
+    """Serve stub OpenAI chat and embedding endpoints (OPENAI_API_BASE=http://host:port/v1)."""
+    server = ThreadingHTTPServer((host, port), StubOpenAIHandler)
+    logger.info(f"Stub OpenAI server listening on http://{host}:{port}/v1")
+    server.serve_forever()
+
+
+@cli.command()
+@click.option("--base-url", default="http://localhost", help="URL of the backend.")
+@click.option(
+    "--endpoint",
+    type=click.Choice(["ask", "telegram"]),
+    default="telegram",
+    help="Replay against /ask or /telegram/ask.",
+)
+@click.option(
+    "--questions",
+    default=None,
+    help="JSONL file of questions (question, body or title field). Reads the Mongo 'query' collection if omitted.",
+)
+@click.option("--mongo-uri", default="mongodb://localhost:27017", help="Mongo to read logged questions from.")
+@click.option("--limit", default=0, help="Replay at most this many questions (0 for all).")
+@click.option("--concurrency", default=4, help="Maximum requests in flight.")
+@click.option("--rate", default=1.0, help="Arrival rate in requests per second.")
+@click.option("--poisson", is_flag=True, default=False, help="Use exponential inter-arrival times.")
+@click.option("--user-id", default="loadtest", help="User ID sent with every request.")
+@click.option("--output", default=None, help="Write the report to this JSON file.")
+def run(
+    base_url,
+    endpoint,
+    questions,
+    mongo_uri,
+    limit,
+    concurrency,
+    rate,
+    poisson,
+    user_id,
+    output,
+):
+    """Replay logged questions against the backend and report latency and errors."""
+    replay = load_questions(questions, mongo_uri, limit)
+    if not replay:
+        raise click.ClickException("No questions to replay")
+
+    token = os.getenv("API_SECRET_TOKEN")
+    user = {
+        "chat_id": user_id,
+        "user_id": user_id,
+        "user_name": user_id,
+        "first_name": "Load",
+        "last_name": "Test",
+    }
+    session = requests.Session()
+    # One pooled connection per worker thread, the default pool only keeps 10
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if endpoint == "ask":
+        # /ask only answers known users, an existing user gets a 400 here
+        session.post(
+            f"{base_url}/users", json=user, headers={"X-API-KEY": token}, timeout=30
+        )
+
+    report = LoadReport()
+    logger.info(
+        f"Replaying {len(replay)} questions at {rate}/s with concurrency {concurrency}"
+    )
+    start = time.perf_counter()
+    scheduled = start
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for question in replay:
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            path, body = build_request(endpoint, question, user)
+            executor.submit(
+                send, session, f"{base_url}{path}", body, token, scheduled, report
+            )
+            scheduled += random.expovariate(rate) if poisson else 1.0 / rate
+
+    summary = report.summary(time.perf_counter() - start)
+    logger.info(f"Load test report:\n{json.dumps(summary, indent=2)}")
+    if output:
+        with open(output, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    cli()
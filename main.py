@@ -1,9 +1,6 @@
 import logging
 import click
-import os
-from plankton.data_processing import get_docs, split_documents
-from plankton.embed_data import get_embeddings, embed_data
-from plankton.conversational_agent import ChatbotManager
+from plankton.routing import ROUTE_METRICS
 
 # Set up logging with time
 logging.basicConfig(
@@ -18,23 +15,106 @@ logger = logging.getLogger(__name__)
     "--delete-existing-db",
     is_flag=True,
     default=False,
-    help="Whether to delete the existing database or not.",
+    help="Rebuild the index as a new version and swap it in once it validates.",
+)
+@click.option(
+    "--corpus",
+    default=None,
+    help="Load split chunks from this corpus artifact instead of parsing data-dir.",
+)
+@click.option(
+    "--save-corpus",
+    default=None,
+    help="Write the split chunks to this corpus artifact.",
+)
+@click.option(
+    "--dedup/--no-dedup",
+    default=True,
+    help="Strip boilerplate lines and drop duplicate chunks before embedding.",
+)
+@click.option(
+    "--rollback",
+    is_flag=True,
+    default=False,
+    help="Serve the previous index version again and exit.",
+)
+@click.option(
+    "--batch",
+    default=None,
+    help="Answer every question of this JSONL file instead of --question.",
+)
+@click.option(
+    "--output",
+    default="answers.jsonl",
+    help="JSONL file the batch answers are appended to, reruns resume from it.",
+)
+@click.option(
+    "--concurrency",
+    default=4,
+    help="Maximum number of batch questions answered at once.",
 )
 @click.option(
     "--question",
     default="Who is the minister of finance",
     help="Question to ask the agent.",
 )
-def main(data_dir, delete_existing_db, question):
+def main(
+    data_dir,
+    delete_existing_db,
+    corpus,
+    save_corpus,
+    dedup,
+    rollback,
+    batch,
+    output,
+    concurrency,
+    question,
+):
+    # Imported here so --help and option errors do not load langchain
+    from plankton.data_processing import get_docs, split_documents
+    from plankton.embed_data import (
+        embed_data,
+        get_embeddings,
+        index_exists,
+        rollback_version,
+    )
+    from plankton.batch import answer_batch
+    from plankton.conversational_agent import ChatbotManager
+    from plankton.corpus import read_corpus, write_corpus
+    from plankton.dedup import remove_duplicates, strip_boilerplate
+
+    if rollback:
+        version = rollback_version()
+        logger.info(f"Rolled back to index version {version}")
+        return
+
     docs = None
-    # Only fetch and chop docs if the data_dir doesn't exist or delete_existing_db is True
-    if not os.path.exists(data_dir) or delete_existing_db:
+    # Only fetch and chop docs if there is no index yet, delete_existing_db is True
+    # or the chunks should be saved
+    needs_docs = not index_exists() or delete_existing_db or save_corpus
+    if needs_docs and corpus:
+        # Chunks were parsed, deduplicated and split by an earlier run
+        logger.info(f"Loading chunks from {corpus}")
+        docs = read_corpus(corpus)
+    elif needs_docs:
         # Get docs from source
         logger.info("Getting documents from source")
         docs = get_docs(data_dir)
+        if dedup:
+            # Drop repeated headers, footers and navigation from every page
+            docs, report = strip_boilerplate(docs)
+            logger.info(f"Boilerplate report: {report}")
         # Chop docs
         logger.info("Splitting documents")
         docs = split_documents(docs)
+        if dedup:
+            # Drop identical and near identical chunks
+            docs, report = remove_duplicates(docs)
+            logger.info(f"Duplicate report: {report}")
+
+    if save_corpus and docs is not None:
+        logger.info(f"Writing {len(docs)} chunks to {save_corpus}")
+        write_corpus(save_corpus, docs)
 
     # Embed all docs and get vectorstore
     logger.info("Embedding documents")
@@ -44,11 +124,18 @@ def main(data_dir, delete_existing_db, question):
         docs=docs, embedding=embed, delete_existing_db=delete_existing_db
     )
 
+    if batch:
+        summary = answer_batch(vectorstore, batch, output, concurrency)
+        logger.info(f"Batch summary: {summary}")
+        logger.info(f"Model route metrics: {ROUTE_METRICS.snapshot()}")
+        return
+
     chatbotManager = ChatbotManager(vectorstore)
     agent = chatbotManager.initialize_agent()
     logger.info(f'Agent question: "{question}"')
     response = agent(question)
     logger.info(f"Agent response: {response['output']}")
+    logger.info(f"Model route metrics: {ROUTE_METRICS.snapshot()}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,138 @@
+from concurrent.futures import ThreadPoolExecutor
+from plankton.conversational_agent import ChatbotManager
+from plankton.source_index import parse_filter
+from plankton.tracing import end_trace, start_trace
+from typing import List
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def load_batch(path) -> List[dict]:
+    """
+    return the question records of a JSONL file. Records use the same shape as
+    requests.jsonl: the question is read from 'question', 'body' or 'title' and
+    'request_id' identifies it (the line number is used when it is missing) and
+    an optional 'filter' restricts retrieval like the /ask endpoint does.
+    """
+    records = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            question = (
+                record.get("question") or record.get("body") or record.get("title")
+            )
+            if not question:
+                logger.warning(f"Skipping line {line_number} without a question")
+                continue
+            request_id = str(record.get("request_id") or line_number)
+            records.append(
+                {
+                    "request_id": request_id,
+                    "question": question,
+                    "filter": record.get("filter"),
+                }
+            )
+    return records
+
+
+def answered_ids(path) -> set:
+    """
+    return the request ids that already have an answer in the output file.
+    The file is rewritten without failed answers, which are retried, and
+    without a line cut short by an interrupted run, so appended answers
+    always start on a line of their own and every id has one line.
+    """
+    if not os.path.exists(path):
+        return set()
+
+    done, kept, rewrite = set(), [], False
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                rewrite = True
+                continue
+            if "answer" not in record or record["request_id"] in done:
+                rewrite = True
+                continue
+            done.add(record["request_id"])
+            kept.append(line if line.endswith("\n") else line + "\n")
+            rewrite = rewrite or not line.endswith("\n")
+
+    if rewrite:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.writelines(kept)
+        os.replace(tmp_path, path)
+    return done
+
+
+def answer_record(record, vectorstore, manager_cls=ChatbotManager) -> dict:
+    """answer one question with a fresh agent over the shared vector store"""
+    trace = start_trace()
+    start = time.perf_counter()
+    try:
+        metadata_filter = parse_filter(record["filter"])
+        manager = manager_cls(vectorstore, metadata_filter=metadata_filter)
+        agent = manager.initialize_agent()
+        response = agent(record["question"])
+        result = {
+            **record,
+            "answer": response["output"],
+            "sources": [
+                {"id": doc.metadata.get("id"), "source": doc.metadata.get("source")}
+                for doc in manager.router.source_documents
+            ],
+        }
+    except Exception as e:
+        logger.warning(f"Question {record['request_id']} failed: {e}")
+        result = {**record, "error": str(e)}
+    finally:
+        end_trace()
+
+    result["seconds"] = round(time.perf_counter() - start, 4)
+    result["trace"] = trace.summary()
+    return result
+
+
+def answer_batch(
+    vectorstore, questions_path, output_path, concurrency=4, manager_cls=ChatbotManager
+) -> dict:
+    """
+    Answer every question of a JSONL file with at most `concurrency` agents
+    running at once, appending one JSON line per answer to the output file.
+    Questions already answered in the output file are skipped, so an
+    interrupted run resumes where it stopped, and failed ones are retried.
+    """
+    records = load_batch(questions_path)
+    done = answered_ids(output_path)
+    pending = [record for record in records if record["request_id"] not in done]
+    logger.info(
+        f"{len(done)} of {len(records)} questions already answered, "
+        f"answering {len(pending)} with concurrency {concurrency}"
+    )
+
+    lock = threading.Lock()
+    summary = {"answered": 0, "failed": 0, "skipped": len(records) - len(pending)}
+
+    with open(output_path, "a") as output:
+
+        def run(record):
+            result = answer_record(record, vectorstore, manager_cls)
+            with lock:
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+                summary["failed" if "error" in result else "answered"] += 1
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(run, pending))
+
+    return summary
@@ -0,0 +1,82 @@
+from langchain.callbacks.base import BaseCallbackHandler
+from plankton.data_processing import tiktoken_len
+from plankton.routing import ROUTE_METRICS
+from plankton.tracing import increment, record_span
+import time
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    Langchain callback that records LLM spans, tiktoken prompt/completion
+    token counts and retries under the given stage name.
+    """
+
+    def __init__(self, stage):
+        self.stage = stage
+        self._starts = {}
+
+    def _start(self, run_id, prompt_text):
+        self._starts[run_id] = time.perf_counter()
+        increment(f"{self.stage}_prompt_tokens", tiktoken_len(prompt_text))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, "\n".join(prompts))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(
+            run_id,
+            "\n".join(message.content for batch in messages for message in batch),
+        )
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        start = self._starts.pop(run_id, None)
+        if start is not None:
+            record_span(self.stage, time.perf_counter() - start)
+        completion = "\n".join(
+            generation.text
+            for generations in response.generations
+            for generation in generations
+        )
+        increment(f"{self.stage}_completion_tokens", tiktoken_len(completion))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._starts.pop(run_id, None)
+        increment(f"{self.stage}_errors")
+
+    def on_retry(self, retry_state, *, run_id, **kwargs):
+        increment(f"{self.stage}_retries")
+
+
+class RouteCallbackHandler(BaseCallbackHandler):
+    """
+    Langchain callback that books the latency and OpenAI reported token usage
+    of every call of one LLM under a model route of the route metrics.
+    For LLMs called outside the ModelRouter, like the conversational agent.
+    """
+
+    def __init__(self, route, metrics=ROUTE_METRICS):
+        self.route = route
+        self.metrics = metrics
+        self._starts = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+
+    def _latency(self, run_id):
+        start = self._starts.pop(run_id, None)
+        return time.perf_counter() - start if start is not None else 0.0
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        self.metrics.record(
+            self.route,
+            self._latency(run_id),
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0),
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self.metrics.record(self.route, self._latency(run_id), error=True)
@@ -1,11 +1,14 @@
 from langchain.agents import Tool
 from langchain.chat_models import ChatOpenAI
 from langchain.chains.conversation.memory import ConversationBufferWindowMemory
-from langchain.chains import RetrievalQA
+from langchain.chains.question_answering import load_qa_chain
 from langchain.retrievers.multi_query import MultiQueryRetriever
 from dotenv import load_dotenv
 import os
 from langchain.agents import initialize_agent
+from plankton.retrieval import PlanktonRetriever
+from plankton.routing import AGENT_ROUTE, ModelRouter
+from plankton.callbacks import RouteCallbackHandler, TracingCallbackHandler
 import logging
 
 # Define the base path
@@ -31,9 +34,15 @@ SYSTEM_MESSAGE = """
 
 
 class ChatbotManager:
-    def __init__(self, vectorstore):
+    def __init__(self, vectorstore, metadata_filter=None):
         # Initialize properties
         self.model_name = "gpt-4"
+        # Cheaper model for query rewriting and simple lookups
+        self.fast_model_name = "gpt-3.5-turbo"
+        # Escalate to model_name below this retrieval relevance score
+        self.min_relevance = 0.75
+        # Fraction of answer words that must appear in the retrieved context
+        self.min_grounding_overlap = 0.5
         self.temperature = 0.0
         self.openai_api_key = OPENAI_API_KEY
         self.request_timeout = 30
@@ -47,34 +56,59 @@ class ChatbotManager:
             "MoF website including PDFs"
         )
         self.vectorstore = vectorstore
+        # Optional source_prefix, doc_type, date_from and date_to restrictions
+        self.metadata_filter = metadata_filter
         self.agent_verbose = True
         self.agent_max_iterations = 3
 
     def initialize_agent(self):
-        self.llm = self._initialize_llm()
+        # Separate instances so each stage is traced under its own name.
+        # The agent only picks the tool and relays its answer, so it runs on
+        # the fast model; the router decides when the strong model answers
+        self.llm = self._initialize_llm(
+            self.fast_model_name, "agent_llm", route=AGENT_ROUTE
+        )
+        self.query_llm = self._initialize_llm(self.fast_model_name, "multi_query_llm")
+        self.fast_llm = self._initialize_llm(self.fast_model_name, "qa_fast_llm")
+        self.strong_llm = self._initialize_llm(stage="qa_strong_llm")
 
         # Initialize retriever, memory and retrieval qa chain
+        self.retriever = self._initialize_retriever()
         self.retriever_from_llm = self._initialize_retriever_from_llm()
         self.conversational_memory = self._initialize_conversational_memory()
         self.qa_tool = self._initialize_retrieval_qa_tool()
         self.agent = self._initialize_agent()
         return self.agent
 
-    def _initialize_llm(self):
+    def _initialize_llm(self, model_name=None, stage="llm", route=None):
         return ChatOpenAI(
             openai_api_key=self.openai_api_key,
-            model_name=self.model_name,
+            model_name=model_name or self.model_name,
             temperature=self.temperature,
             request_timeout=self.request_timeout,
             max_retries=self.max_retries,
+            callbacks=self._llm_callbacks(stage, route),
+        )
+
+    def _llm_callbacks(self, stage, route=None):
+        # LLMs the ModelRouter calls are booked to their route by the router itself
+        callbacks = [TracingCallbackHandler(stage)]
+        if route:
+            callbacks.append(RouteCallbackHandler(route))
+        return callbacks
+
+    def _initialize_retriever(self):
+        return PlanktonRetriever(
+            vectorstore=self.vectorstore,
+            search_type=self.search_type,
+            search_kwargs=self.search_kwargs,
+            metadata_filter=self.metadata_filter,
         )
 
     def _initialize_retriever_from_llm(self):
         return MultiQueryRetriever.from_llm(
-            retriever=self.vectorstore.as_retriever(
-                search_type=self.search_type, search_kwargs=self.search_kwargs
-            ),
-            llm=self.llm,
+            retriever=self.retriever,
+            llm=self.query_llm,
             parser_key=self.parser_key,
         )
 
@@ -83,17 +117,23 @@ class ChatbotManager:
             memory_key="chat_history", k=3, return_messages=True
         )
 
+    def _initialize_qa_chain(self, llm):
+        # The router retrieves the chunks once and passes them to either chain
+        return load_qa_chain(llm=llm, chain_type="stuff", verbose=True)
+
     def _initialize_retrieval_qa_tool(self):
-        qa = RetrievalQA.from_chain_type(
-            llm=self.llm,
-            chain_type="stuff",
+        self.router = ModelRouter(
+            fast_qa=self._initialize_qa_chain(self.fast_llm),
+            strong_qa=self._initialize_qa_chain(self.strong_llm),
             retriever=self.retriever_from_llm,
-            verbose=True,
+            relevance=self.retriever.relevance,
+            min_relevance=self.min_relevance,
+            min_overlap=self.min_grounding_overlap,
         )
 
         return Tool(
             name=self.tool_name,
-            func=qa.run,
+            func=self.router.run,
             description=self.tool_description,
         )
 
@@ -0,0 +1,132 @@
+from langchain.docstore.document import Document
+from plankton.data_processing import tiktoken_len
+from typing import Iterator, List
+import json
+import mmap
+import os
+import struct
+
+# File layout, all integers little endian:
+#   header | text offsets | metadata offsets | token counts | text blob | metadata blob
+# The offset columns hold count + 1 u64 values so chunk i spans [offsets[i], offsets[i + 1])
+# inside its blob; token counts are u32. Every section starts on an 8 byte boundary.
+MAGIC = b"PLKC"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHHQQQQQQ")
+
+
+def _align(position, alignment=8):
+    return (position + alignment - 1) // alignment * alignment
+
+
+def write_corpus(path, docs: List[Document]):
+    """
+    Write split chunks, their tiktoken counts and metadata to a compact,
+    memory mappable artifact. The file is written next to the target and
+    moved into place, so readers never see a partial artifact.
+    """
+    texts = [doc.page_content.encode("utf-8") for doc in docs]
+    metadatas = [
+        json.dumps(doc.metadata, separators=(",", ":")).encode("utf-8") for doc in docs
+    ]
+    tokens = [tiktoken_len(doc.page_content) for doc in docs]
+
+    def offsets(blobs):
+        values, position = [0], 0
+        for blob in blobs:
+            position += len(blob)
+            values.append(position)
+        return struct.pack(f"<{len(values)}Q", *values)
+
+    sections = [
+        offsets(texts),
+        offsets(metadatas),
+        struct.pack(f"<{len(tokens)}I", *tokens),
+        b"".join(texts),
+        b"".join(metadatas),
+    ]
+
+    positions, position = [], _align(HEADER.size)
+    for section in sections:
+        positions.append(position)
+        position = _align(position + len(section))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(docs), *positions))
+        for section, start in zip(sections, positions):
+            f.write(b"\0" * (start - f.tell()))
+            f.write(section)
+    os.replace(tmp_path, path)
+
+
+class CorpusReader:
+    """
+    Memory mapped reader for artifacts written by write_corpus.
+    Chunks are decoded on access, so opening a large corpus is instant.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        (
+            magic,
+            version,
+            _,
+            self._count,
+            self._text_offsets,
+            self._metadata_offsets,
+            self._tokens,
+            self._text_blob,
+            self._metadata_blob,
+        ) = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} corpus")
+
+    def __len__(self):
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def _read(self, offsets, blob, index) -> bytes:
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        start, end = struct.unpack_from("<2Q", self._mmap, offsets + 8 * index)
+        return self._mmap[blob + start : blob + end]
+
+    def text(self, index) -> str:
+        return self._read(self._text_offsets, self._text_blob, index).decode("utf-8")
+
+    def metadata(self, index) -> dict:
+        return json.loads(
+            self._read(self._metadata_offsets, self._metadata_blob, index)
+        )
+
+    def tokens(self, index) -> int:
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return struct.unpack_from("<I", self._mmap, self._tokens + 4 * index)[0]
+
+    def total_tokens(self) -> int:
+        return sum(struct.unpack_from(f"<{self._count}I", self._mmap, self._tokens))
+
+    def __getitem__(self, index) -> Document:
+        return Document(page_content=self.text(index), metadata=self.metadata(index))
+
+    def __iter__(self) -> Iterator[Document]:
+        return (self[index] for index in range(self._count))
+
+
+def read_corpus(path) -> List[Document]:
+    """return every chunk of a corpus artifact as a Document"""
+    with CorpusReader(path) as reader:
+        return list(reader)
@@ -1,15 +1,16 @@
 from langchain.document_loaders import JSONLoader, DirectoryLoader
 from langchain.docstore.document import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-import tiktoken
+from functools import lru_cache
 from typing import List
 
-tiktoken.encoding_for_model("gpt-4")
-
 
 def metadata_func(record: dict, metadata: dict) -> dict:
     metadata["id"] = record.get("id")
     metadata["source"] = record.get("source")
+    if record.get("date"):
+        # Publication date as an ISO string, used by date filtered retrieval
+        metadata["date"] = record.get("date")
     # metadata["tokens"] = record.get("tokens")
 
     return metadata
@@ -32,9 +33,17 @@ def get_docs(folder) -> List[Document]:
     ).load()
 
 
+@lru_cache(maxsize=None)
+def get_tokenizer():
+    """load the gpt-4 tokenizer once, on first use instead of at import"""
+    import tiktoken
+
+    return tiktoken.get_encoding("cl100k_base")
+
+
 def tiktoken_len(text):
     # create the length function
-    tokenizer = tiktoken.get_encoding("cl100k_base")
+    tokenizer = get_tokenizer()
     tokens = tokenizer.encode(text, disallowed_special=())
     return len(tokens)
 
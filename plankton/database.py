@@ -1,3 +1,4 @@
+from plankton.tracing import span
 import pymongo
 
 
@@ -12,20 +13,26 @@ class Database(object):
 
     @staticmethod
     def insert(collection, data):
-        return Database.DATABASE[collection].insert_one(data)
+        with span("mongo_insert"):
+            return Database.DATABASE[collection].insert_one(data)
 
     @staticmethod
     def find(collection, query):
-        return Database.DATABASE[collection].find(query)
+        # pymongo cursors are lazy, read the results so the span times the query
+        with span("mongo_find"):
+            return list(Database.DATABASE[collection].find(query))
 
     @staticmethod
     def find_one(collection, query):
-        return Database.DATABASE[collection].find_one(query)
+        with span("mongo_find_one"):
+            return Database.DATABASE[collection].find_one(query)
 
     @staticmethod
     def update(collection, query, data):
-        return Database.DATABASE[collection].update_one(query, {"$set": data})
+        with span("mongo_update"):
+            return Database.DATABASE[collection].update_one(query, {"$set": data})
 
     @staticmethod
     def delete_many(collection, query):
-        return Database.DATABASE[collection].delete_many(query)
+        with span("mongo_delete_many"):
+            return Database.DATABASE[collection].delete_many(query)
@@ -0,0 +1,164 @@
+from collections import Counter
+from langchain.docstore.document import Document
+from plankton.data_processing import tiktoken_len
+from plankton.source_index import ALT_SOURCES_KEY, alt_sources
+from typing import Dict, List, Tuple
+import hashlib
+import random
+import re
+
+WORD_PATTERN = re.compile(r"\w+")
+
+# Mersenne prime used for the MinHash permutations
+MERSENNE_PRIME = (1 << 61) - 1
+
+
+def add_alt_source(doc: Document, source) -> Document:
+    """return doc with source recorded as another source of its content"""
+    if not source or source == doc.metadata.get("source"):
+        return doc
+    sources = alt_sources(doc.metadata)
+    if source in sources:
+        return doc
+    metadata = {**doc.metadata, ALT_SOURCES_KEY: "\n".join(sources + [source])}
+    return Document(page_content=doc.page_content, metadata=metadata)
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def strip_boilerplate(
+    docs: List[Document], min_share=0.3, min_docs=5
+) -> Tuple[List[Document], Dict[str, int]]:
+    """
+    Remove lines (headers, footers, navigation) that appear in at least
+    min_share of the documents and in at least min_docs of them.
+    Run on whole pages, before splitting.
+    """
+    line_counts = Counter()
+    for doc in docs:
+        line_counts.update({normalize(line) for line in doc.page_content.splitlines()})
+    line_counts.pop("", None)
+
+    threshold = max(min_docs, min_share * len(docs))
+    boilerplate = {line for line, count in line_counts.items() if count >= threshold}
+
+    stripped, lines_removed, tokens_removed = [], 0, 0
+    for doc in docs:
+        kept = []
+        for line in doc.page_content.splitlines():
+            if normalize(line) in boilerplate:
+                lines_removed += 1
+                tokens_removed += tiktoken_len(line)
+            else:
+                kept.append(line)
+        text = "\n".join(kept).strip()
+        if text:
+            stripped.append(Document(page_content=text, metadata=doc.metadata))
+
+    return stripped, {
+        "boilerplate_lines": len(boilerplate),
+        "boilerplate_lines_removed": lines_removed,
+        "boilerplate_tokens_removed": tokens_removed,
+        "documents_emptied": len(docs) - len(stripped),
+    }
+
+
+class MinHasher:
+    """MinHash signatures over word shingles with seeded universal hashing"""
+
+    def __init__(self, num_perm=64, shingle_size=5, seed=1):
+        rng = random.Random(seed)
+        self.shingle_size = shingle_size
+        self.permutations = [
+            (rng.randrange(1, MERSENNE_PRIME), rng.randrange(0, MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def shingles(self, text: str) -> set:
+        words = WORD_PATTERN.findall(text.lower())
+        size = min(self.shingle_size, len(words)) or 1
+        return {
+            " ".join(words[i : i + size]) for i in range(max(len(words) - size + 1, 1))
+        }
+
+    def signature(self, text: str) -> Tuple[int, ...]:
+        hashes = [
+            int.from_bytes(
+                hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little"
+            )
+            for s in self.shingles(text)
+        ]
+        return tuple(
+            min((a * h + b) % MERSENNE_PRIME for h in hashes)
+            for a, b in self.permutations
+        )
+
+
+def similarity(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+    """estimated Jaccard similarity of two MinHash signatures"""
+    return sum(x == y for x, y in zip(first, second)) / len(first)
+
+
+def remove_duplicates(
+    docs: List[Document], threshold=0.8, num_perm=64, bands=8
+) -> Tuple[List[Document], Dict[str, int]]:
+    """
+    Drop chunks that are exact duplicates (after whitespace and case
+    normalization) or near duplicates of an earlier chunk. Near duplicates are
+    found with MinHash and LSH banding, then confirmed against the threshold.
+    The source of a dropped chunk is kept on the chunk it duplicates, so the
+    same PDF served from two URLs is still found under either URL.
+    """
+    hasher = MinHasher(num_perm=num_perm)
+    rows = num_perm // bands
+
+    seen_hashes = {}
+    buckets = {}
+    signatures = []
+    kept = []
+    exact, near, tokens_removed = 0, 0, 0
+
+    for doc in docs:
+        digest = hashlib.sha1(normalize(doc.page_content).encode("utf-8")).digest()
+        source = doc.metadata.get("source")
+        if digest in seen_hashes:
+            index = seen_hashes[digest]
+            kept[index] = add_alt_source(kept[index], source)
+            exact += 1
+            tokens_removed += tiktoken_len(doc.page_content)
+            continue
+
+        signature = hasher.signature(doc.page_content)
+        band_keys = [
+            (band, signature[band * rows : (band + 1) * rows]) for band in range(bands)
+        ]
+        candidates = {index for key in band_keys for index in buckets.get(key, ())}
+        duplicate_of = next(
+            (
+                i
+                for i in sorted(candidates)
+                if similarity(signature, signatures[i]) >= threshold
+            ),
+            None,
+        )
+        if duplicate_of is not None:
+            kept[duplicate_of] = add_alt_source(kept[duplicate_of], source)
+            near += 1
+            tokens_removed += tiktoken_len(doc.page_content)
+            continue
+
+        seen_hashes[digest] = len(kept)
+        for key in band_keys:
+            buckets.setdefault(key, []).append(len(signatures))
+        signatures.append(signature)
+        kept.append(doc)
+
+    return kept, {
+        "chunks_in": len(docs),
+        "exact_duplicates": exact,
+        "near_duplicates": near,
+        "chunks_out": len(kept),
+        "duplicate_tokens_removed": tokens_removed,
+    }
@@ -2,14 +2,33 @@ from langchain.embeddings.openai import OpenAIEmbeddings
 import os
 from dotenv import load_dotenv
 from langchain.vectorstores import Chroma
-from typing import List
+from typing import List, Optional
 from langchain.docstore.document import Document
+from plankton.locks import store_lock
+from plankton.retrieval import clear_caches
+from plankton.source_index import SourceIndex
+from plankton.tracing import span
+import atexit
+import datetime
+import logging
+import re
 import shutil
+import threading
+import uuid
 
 
 DATABASE_DIR = "chroma_db"
 DB_COLLECTION = "plankton_1"
 
+# Files inside DATABASE_DIR naming the served index version and the one before it
+CURRENT_POINTER = "CURRENT"
+PREVIOUS_POINTER = "PREVIOUS"
+
+# Version directories are named after their build time, e.g. 20231018093000
+VERSION_PATTERN = re.compile(r"^\d{14}(_1)*$")
+
+logger = logging.getLogger(__name__)
+
 
 # Define the base path
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -23,13 +42,29 @@ load_dotenv(dotenv_path)
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 
+class TracedOpenAIEmbeddings(OpenAIEmbeddings):
+    """OpenAIEmbeddings that records every embedding call as a trace span"""
+
+    def embed_documents(
+        self, texts: List[str], chunk_size: Optional[int] = 0
+    ) -> List[List[float]]:
+        with span("document_embedding"):
+            return super().embed_documents(texts, chunk_size)
+
+    def embed_query(self, text: str) -> List[float]:
+        # OpenAIEmbeddings.embed_query goes through embed_documents, which
+        # would record the query as a document embedding span as well
+        with span("query_embedding"):
+            return OpenAIEmbeddings.embed_documents(self, [text])[0]
+
+
 def get_embeddings(
     max_retries=100, request_timeout=20000, show_progress_bar=True
 ) -> OpenAIEmbeddings:
     # Retrieve the API key from environment variable
     model_name = "text-embedding-ada-002"
 
-    embed = OpenAIEmbeddings(
+    embed = TracedOpenAIEmbeddings(
         model=model_name,
         openai_api_key=OPENAI_API_KEY,
         max_retries=max_retries,  # large retries to deal with rate
@@ -39,6 +74,194 @@ def get_embeddings(
     return embed
 
 
+def list_versions(persist_directory=DATABASE_DIR) -> List[str]:
+    """return the index versions built under the persist directory, oldest first"""
+    if not os.path.isdir(persist_directory):
+        return []
+    return sorted(
+        name
+        for name in os.listdir(persist_directory)
+        if VERSION_PATTERN.match(name)
+        and os.path.isdir(os.path.join(persist_directory, name))
+    )
+
+
+def _read_pointer(persist_directory, pointer) -> Optional[str]:
+    try:
+        with open(os.path.join(persist_directory, pointer)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _write_pointer(persist_directory, pointer, version):
+    """replace a pointer file atomically, readers see the old or the new version"""
+    path = os.path.join(persist_directory, pointer)
+    with open(f"{path}.tmp", "w") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f"{path}.tmp", path)
+
+
+def current_version(persist_directory=DATABASE_DIR) -> Optional[str]:
+    """return the active index version, None for a legacy unversioned index"""
+    return _read_pointer(persist_directory, CURRENT_POINTER)
+
+
+def previous_version(persist_directory=DATABASE_DIR) -> Optional[str]:
+    """return the version that was active before the current one"""
+    return _read_pointer(persist_directory, PREVIOUS_POINTER)
+
+
+def version_directory(persist_directory=DATABASE_DIR, version=None) -> str:
+    """return the directory holding an index version"""
+    return os.path.join(persist_directory, version) if version else persist_directory
+
+
+def index_exists(persist_directory=DATABASE_DIR) -> bool:
+    """return whether there is an index to serve, versioned or legacy"""
+    if current_version(persist_directory):
+        return True
+    return os.path.isdir(persist_directory) and any(
+        name.endswith(".parquet") for name in os.listdir(persist_directory)
+    )
+
+
+def migrate_legacy_index(persist_directory=DATABASE_DIR) -> Optional[str]:
+    """
+    Move an unversioned index (parquet files and the HNSW index directory in
+    the persist directory itself) into a version directory and serve it from
+    there, so the first versioned rebuild can be rolled back to it.
+    Return the new version, or None when there is no legacy index.
+    """
+    if current_version(persist_directory) or not index_exists(persist_directory):
+        return None
+
+    legacy_files = [
+        name
+        for name in os.listdir(persist_directory)
+        if name.endswith(".parquet") or name == "index"
+    ]
+    modified = max(
+        os.path.getmtime(os.path.join(persist_directory, name)) for name in legacy_files
+    )
+    version = datetime.datetime.fromtimestamp(modified).strftime("%Y%m%d%H%M%S")
+    while os.path.exists(version_directory(persist_directory, version)):
+        version += "_1"
+    directory = version_directory(persist_directory, version)
+
+    os.makedirs(directory)
+    for name in legacy_files:
+        shutil.move(os.path.join(persist_directory, name), directory)
+    _write_pointer(persist_directory, CURRENT_POINTER, version)
+    logger.info(f"Moved the legacy index to version {version}")
+    return version
+
+
+def activate_version(version, persist_directory=DATABASE_DIR):
+    """
+    Point the serving index at a version and remember the version it replaces
+    for rollback.
+    """
+    if not os.path.isdir(version_directory(persist_directory, version)):
+        raise ValueError(f"Index version {version} does not exist")
+
+    active = current_version(persist_directory)
+    if active and active != version:
+        _write_pointer(persist_directory, PREVIOUS_POINTER, active)
+    _write_pointer(persist_directory, CURRENT_POINTER, version)
+    logger.info(f"Serving index version {version}")
+
+
+def rollback_version(persist_directory=DATABASE_DIR) -> str:
+    """activate the version that was served before the current one and return it"""
+    version = previous_version(persist_directory)
+    if not version or not os.path.isdir(version_directory(persist_directory, version)):
+        raise ValueError("There is no previous index version to roll back to")
+
+    activate_version(version, persist_directory)
+    return version
+
+
+def prune_versions(persist_directory=DATABASE_DIR):
+    """delete every version except the active one and the previous one"""
+    keep = {current_version(persist_directory), previous_version(persist_directory)}
+    for version in list_versions(persist_directory):
+        if version not in keep:
+            shutil.rmtree(version_directory(persist_directory, version))
+            logger.info(f"Deleted index version {version}")
+
+
+def validate_index(vectorstore: Chroma, docs: List[Document]):
+    """raise if a freshly built index is missing documents or cannot be searched"""
+    with store_lock(vectorstore):
+        count = vectorstore._collection.count()
+        if count != len(docs):
+            raise ValueError(f"Index holds {count} chunks, expected {len(docs)}")
+        if not vectorstore.similarity_search(docs[0].page_content, k=1):
+            raise ValueError("Index returned no results for a known chunk")
+
+
+def build_index(
+    embedding: OpenAIEmbeddings,
+    docs: List[Document],
+    persist_directory=DATABASE_DIR,
+    collection_name=DB_COLLECTION,
+) -> Chroma:
+    """
+    Embed the documents and their source index into a new version directory
+    next to the served one, validate it and only then swap the pointer to it.
+    A failed build leaves the served version untouched.
+    """
+    if not docs:
+        raise ValueError("Cannot build an index without documents")
+
+    # Gives a pre-versioning index a version the new one can be rolled back to
+    migrate_legacy_index(persist_directory)
+
+    version = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    while os.path.exists(version_directory(persist_directory, version)):
+        version += "_1"
+    directory = version_directory(persist_directory, version)
+    logger.info(f"Building index version {version}")
+
+    ids = [str(uuid.uuid4()) for _ in docs]
+    vectorstore = Chroma(
+        persist_directory=directory,
+        embedding_function=embedding,
+        collection_name=collection_name,
+    )
+    try:
+        vectorstore.add_documents(docs, ids=ids)
+        vectorstore.persist()
+        validate_index(vectorstore, docs)
+        # Lets metadata filtered retrieval pick candidate chunks without a scan
+        SourceIndex.from_documents(ids, docs).save(directory)
+    except Exception:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    finally:
+        # Written once above, a write at exit would revive a pruned directory
+        release_vector_store(vectorstore)
+
+    activate_version(version, persist_directory)
+    prune_versions(persist_directory)
+    return vectorstore
+
+
+def release_vector_store(vectorstore: Chroma):
+    """
+    Stop Chroma 0.3 from persisting a store when the interpreter exits.
+    Its atexit hook keeps every store ever opened in memory, and writes it back
+    to its directory at exit, which recreates moved or pruned versions.
+    Indexes are only written by build_index, which persists explicitly.
+    """
+    db = getattr(vectorstore._client, "_db", None)
+    if db is not None:
+        atexit.unregister(db.persist)
+
+
 def get_vector_store(
     embedding_function: OpenAIEmbeddings,
     persist_directory=DATABASE_DIR,
@@ -46,13 +269,50 @@ def get_vector_store(
 ):
     """
     This function creates and returns a vector store (Chroma) instance
-    using the provided embedding function, persist directory, and collection name.
+    using the provided embedding function, the active index version under the
+    persist directory, and collection name. The store is opened read only.
     """
-    return Chroma(
-        persist_directory=persist_directory,
+    vectorstore = Chroma(
+        persist_directory=version_directory(
+            persist_directory, current_version(persist_directory)
+        ),
         embedding_function=embedding_function,
         collection_name=collection_name,
     )
+    release_vector_store(vectorstore)
+    return vectorstore
+
+
+_serving_lock = threading.Lock()
+_serving = {"version": None, "vectorstore": None}
+
+
+def get_serving_vector_store(
+    embedding_function: OpenAIEmbeddings,
+    persist_directory=DATABASE_DIR,
+    collection_name=DB_COLLECTION,
+) -> Chroma:
+    """
+    Return the vector store the backend answers from. It is opened once and
+    reopened whenever the active version changes, so rebuilds and rollbacks
+    are picked up without restarting the service. Request threads share it,
+    so its collection must only be used under plankton.locks.store_lock.
+    """
+    version = current_version(persist_directory)
+    with _serving_lock:
+        if _serving["vectorstore"] is None or _serving["version"] != version:
+            if _serving["vectorstore"] is not None:
+                # Cached results belong to the old collection and can never be hit again
+                clear_caches()
+            with span("embed_data"):
+                _serving["vectorstore"] = get_vector_store(
+                    embedding_function=embedding_function,
+                    persist_directory=persist_directory,
+                    collection_name=collection_name,
+                )
+            _serving["version"] = version
+            logger.info(f"Loaded index version {version or 'legacy'}")
+        return _serving["vectorstore"]
 
 
 def embed_data(
@@ -63,28 +323,23 @@ def embed_data(
     delete_existing_db=False,
 ) -> Chroma:
     """
-    This function either creates a new Chroma instance by embedding the
-    supplied documents or retrieves an existing vector store from the specified location.
-    If delete_existing_db is True and the DATABASE_DIR already exists,
-    the existing directory and its contents are deleted before embedding documents.
+    This function either builds a new index version by embedding the
+    supplied documents or retrieves the active vector store from the specified location.
+    If delete_existing_db is True a new version is built side by side and swapped in;
+    the previous version is kept for rollback instead of being deleted.
     """
-    # Delete the existing DB if requested
-    if delete_existing_db and os.path.exists(DATABASE_DIR):
-        shutil.rmtree(DATABASE_DIR)
-
-    # If the persisting directory doesn't exist, create a new Chroma from the documents.
-    # Otherwise, get the Chroma instance from the existing vector store.
-    return (
-        Chroma.from_documents(
-            documents=docs,
-            embedding=embedding,
-            persist_directory=persist_directory,
-            collection_name=collection_name,
-        )
-        if not os.path.exists(DATABASE_DIR)
-        else get_vector_store(
+    # If there is no index yet, or a rebuild was requested, build a new version.
+    # Otherwise, get the Chroma instance from the active version.
+    with span("embed_data"):
+        if delete_existing_db or not index_exists(persist_directory):
+            return build_index(
+                embedding=embedding,
+                docs=docs,
+                persist_directory=persist_directory,
+                collection_name=collection_name,
+            )
+        return get_vector_store(
             embedding_function=embedding,
             persist_directory=persist_directory,
             collection_name=collection_name,
         )
-    )
@@ -0,0 +1,17 @@
+import threading
+
+_lock = threading.Lock()
+
+
+def store_lock(vectorstore) -> threading.RLock:
+    """
+    return the lock guarding a Chroma vector store. A Chroma 0.3 client runs on
+    one DuckDB connection, which is not thread safe, so every call on the
+    collection of a store shared between threads must hold this lock.
+    """
+    with _lock:
+        lock = getattr(vectorstore, "_plankton_lock", None)
+        if lock is None:
+            lock = threading.RLock()
+            vectorstore._plankton_lock = lock
+        return lock
@@ -0,0 +1,260 @@
+from collections import OrderedDict
+from langchain.callbacks.manager import CallbackManagerForRetrieverRun
+from langchain.docstore.document import Document
+from langchain.pydantic_v1 import Field
+from langchain.vectorstores.base import VectorStoreRetriever
+from langchain.vectorstores.utils import maximal_marginal_relevance
+from plankton.locks import store_lock
+from plankton.source_index import clear_source_indexes, get_source_index
+from plankton.tracing import increment, span
+from typing import Dict, List, Optional, Tuple
+import json
+import math
+import numpy as np
+import threading
+
+# Number of (query, search settings, index version) results kept in memory
+RETRIEVAL_CACHE_SIZE = 1024
+
+# Filters selecting at most this many chunks are scored exactly against a
+# cached embedding matrix, larger ones go through the HNSW index
+MAX_SCAN_CANDIDATES = 2048
+
+# Number of (filter, index version) embedding matrices kept in memory
+CANDIDATE_CACHE_SIZE = 16
+
+# Extra neighbours fetched from HNSW per wanted chunk when a large filter
+# is applied to the results afterwards
+OVERFETCH_FACTOR = 2
+
+
+class RetrievalCache:
+    """Thread safe LRU cache shared by every request"""
+
+    def __init__(self, max_size=RETRIEVAL_CACHE_SIZE, name="retrieval_cache"):
+        self.max_size = max_size
+        self.name = name
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                increment(f"{self.name}_misses")
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        increment(f"{self.name}_hits")
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def reset(self):
+        """clear the entries and the hit and miss counts"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def hit_rate(self) -> float:
+        with self._lock:
+            total = self.hits + self.misses
+            return self.hits / total if total else 0.0
+
+
+# (chunks, relevance scores) per query
+RETRIEVAL_CACHE = RetrievalCache()
+
+# (chunks, unit normed embedding matrix) per filter and collection
+CANDIDATE_CACHE = RetrievalCache(CANDIDATE_CACHE_SIZE, name="candidate_cache")
+
+
+def clear_caches():
+    """drop cached results, for when the served index changes"""
+    RETRIEVAL_CACHE.clear()
+    CANDIDATE_CACHE.clear()
+    clear_source_indexes()
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def relevance_score(similarity: float) -> float:
+    """
+    Chroma's relevance score for squared L2 distances, which for unit vectors
+    are 2 - 2 * cosine, so every search path reports comparable scores
+    """
+    return 1.0 - (2 - 2 * similarity) / math.sqrt(2)
+
+
+def _unit_rows(embeddings) -> np.ndarray:
+    matrix = np.array(embeddings, dtype=float)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class PlanktonRetriever(VectorStoreRetriever):
+    """
+    Vector store retriever used by the ChatbotManager.
+    The query is embedded once per search, and the relevance of every chunk
+    found is kept so callers can judge retrieval confidence without searching again.
+    Results are cached per normalized query, search settings, metadata filter
+    and collection, so a rebuilt index never serves chunks cached from the previous one.
+    With a metadata_filter (see plankton.source_index.FILTER_KEYS) only the chunks
+    the source index selects are candidates: small selections are scored against
+    a cached embedding matrix, large ones are searched with HNSW and over-fetched.
+    The vector search (query embedding included) is recorded as a trace span.
+    """
+
+    metadata_filter: Optional[dict] = None
+    # Best relevance score seen by this retriever, per chunk text
+    scores: Dict[str, float] = Field(default_factory=dict)
+
+    def _collection_key(self):
+        # Every index build creates a new Chroma collection with its own id
+        collection = getattr(self.vectorstore, "_collection", None)
+        return str(collection.id) if collection else id(self.vectorstore)
+
+    def _cache_key(self, query: str) -> tuple:
+        return (
+            normalize_query(query),
+            self.search_type,
+            json.dumps(self.search_kwargs, sort_keys=True, default=str),
+            json.dumps(self.metadata_filter, sort_keys=True),
+            self._collection_key(),
+        )
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        docs, scores = self._search(query)
+        return docs
+
+    def _search(self, query: str) -> Tuple[List[Document], List[float]]:
+        key = self._cache_key(query)
+        result = RETRIEVAL_CACHE.get(key)
+        if result is None:
+            with span("vector_search"):
+                result = self._uncached_search(query)
+            RETRIEVAL_CACHE.put(key, result)
+
+        docs, scores = result
+        for doc, score in zip(docs, scores):
+            self.scores[doc.page_content] = max(
+                score, self.scores.get(doc.page_content, score)
+            )
+        return list(docs), list(scores)
+
+    def relevance(self, doc: Document) -> float:
+        """return the relevance score of a chunk this retriever returned, else 0.0"""
+        return self.scores.get(doc.page_content, 0.0)
+
+    def _uncached_search(self, query: str) -> Tuple[List[Document], List[float]]:
+        k = self.search_kwargs.get("k", 4)
+        fetch_k = (
+            self.search_kwargs.get("fetch_k", 20) if self.search_type == "mmr" else k
+        )
+        query_embedding = np.array(
+            self.vectorstore._embedding_function.embed_query(query)
+        )
+
+        docs, embeddings = self._candidates(query_embedding, fetch_k)
+        if not docs:
+            return [], []
+
+        norm = np.linalg.norm(query_embedding) or 1.0
+        similarities = embeddings @ (query_embedding / norm)
+        top = np.argsort(-similarities)[:fetch_k]
+        if self.search_type == "mmr":
+            # Same as Chroma's MMR: rerank the fetch_k most similar chunks
+            picks = maximal_marginal_relevance(
+                query_embedding,
+                embeddings[top],
+                lambda_mult=self.search_kwargs.get("lambda_mult", 0.5),
+                k=k,
+            )
+            top = [top[i] for i in picks]
+        else:
+            top = top[:k]
+        return (
+            [docs[i] for i in top],
+            [relevance_score(similarities[i]) for i in top],
+        )
+
+    def _candidates(self, query_embedding, fetch_k):
+        """return candidate chunks and their unit normed embeddings for a query"""
+        if not self.metadata_filter:
+            return self._query(query_embedding, fetch_k)
+
+        ids = get_source_index(self.vectorstore).select(**self.metadata_filter)
+        if not ids:
+            return [], None
+        if len(ids) <= MAX_SCAN_CANDIDATES:
+            return self._filter_matrix(ids)
+
+        # Chroma 0.3 has no prefix or $in operators, and a where clause on
+        # "source" would miss alt_sources, so filter the nearest neighbours
+        # instead, fetching more until enough of them match
+        wanted = set(ids)
+        with store_lock(self.vectorstore):
+            total = self.vectorstore._collection.count()
+        n_results = min(
+            total,
+            fetch_k * OVERFETCH_FACTOR * math.ceil(total / len(wanted)),
+        )
+        while True:
+            docs, embeddings, result_ids = self._query(
+                query_embedding, n_results, with_ids=True
+            )
+            keep = [i for i, chunk_id in enumerate(result_ids) if chunk_id in wanted]
+            if len(keep) >= fetch_k or n_results >= total:
+                return [docs[i] for i in keep], embeddings[keep]
+            n_results = min(total, n_results * 2)
+
+    def _query(self, query_embedding, n_results, with_ids=False):
+        with store_lock(self.vectorstore):
+            results = self.vectorstore._collection.query(
+                query_embeddings=[query_embedding.tolist()],
+                n_results=n_results,
+                include=["embeddings", "documents", "metadatas"],
+            )
+        docs = [
+            Document(page_content=text, metadata=metadata or {})
+            for text, metadata in zip(results["documents"][0], results["metadatas"][0])
+        ]
+        embeddings = _unit_rows(results["embeddings"][0]) if docs else None
+        if with_ids:
+            return docs, embeddings, results["ids"][0]
+        return docs, embeddings
+
+    def _filter_matrix(self, ids: List[str]):
+        """return the chunks of a filter and their embeddings, fetched once per index"""
+        key = (json.dumps(self.metadata_filter, sort_keys=True), self._collection_key())
+        candidates = CANDIDATE_CACHE.get(key)
+        if candidates is None:
+            with store_lock(self.vectorstore):
+                results = self.vectorstore._collection.get(
+                    ids=ids, include=["embeddings", "documents", "metadatas"]
+                )
+            docs = [
+                Document(page_content=text, metadata=metadata or {})
+                for text, metadata in zip(results["documents"], results["metadatas"])
+            ]
+            candidates = (docs, _unit_rows(results["embeddings"]))
+            CANDIDATE_CACHE.put(key, candidates)
+        return candidates
@@ -0,0 +1,179 @@
+from typing import Dict, List
+import logging
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+FAST_ROUTE = "fast"
+STRONG_ROUTE = "strong"
+# Query rewriting by the multi query retriever, booked apart from the QA models
+MULTI_QUERY_ROUTE = "multi_query"
+# The conversational agent deciding to call the knowledge base tool and relaying its answer
+AGENT_ROUTE = "agent"
+
+# Phrases the cheap model uses when it could not find the answer in the context
+REFUSAL_PATTERNS = re.compile(
+    r"\b(i don't know|i do not know|not sure|no information|"
+    r"not mentioned|cannot find|can't find|unable to)\b",
+    re.IGNORECASE,
+)
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Answers of at most this many words with nothing to check, like "Yes"
+SHORT_ANSWER_WORDS = 3
+
+
+def _is_content_word(word: str) -> bool:
+    # Numbers carry the facts of short answers ("9%", "2018"), keep them all
+    return len(word) >= 4 or any(char.isdigit() for char in word)
+
+
+class RouteMetrics:
+    """
+    Process wide latency and token counters for every model route.
+    Kept at module level so they survive the per-request ChatbotManager.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def record(self, route, latency, prompt_tokens=0, completion_tokens=0, error=False):
+        with self._lock:
+            stats = self._routes.setdefault(
+                route,
+                {
+                    "calls": 0,
+                    "errors": 0,
+                    "latency_seconds": 0.0,
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0,
+                },
+            )
+            stats["calls"] += 1
+            stats["errors"] += int(error)
+            stats["latency_seconds"] += latency
+            stats["prompt_tokens"] += prompt_tokens
+            stats["completion_tokens"] += completion_tokens
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return {route: dict(stats) for route, stats in self._routes.items()}
+
+
+ROUTE_METRICS = RouteMetrics()
+
+
+def is_grounded(answer: str, context: str, min_overlap=0.5) -> bool:
+    """
+    Cheap grounding check: the answer must not be a refusal and most of its
+    content words, and all of its numbers, must appear in the retrieved context.
+    Short answers without content words, like "Yes", are accepted.
+    """
+    if not answer or REFUSAL_PATTERNS.search(answer):
+        return False
+
+    words = WORD_PATTERN.findall(answer.lower())
+    answer_words = {word for word in words if _is_content_word(word)}
+    if not answer_words:
+        return 0 < len(words) <= SHORT_ANSWER_WORDS
+
+    context_words = set(WORD_PATTERN.findall(context.lower()))
+    # A wrong figure is the costliest mistake, so every number must be found
+    if any(word.isdigit() and word not in context_words for word in answer_words):
+        return False
+    overlap = len(answer_words & context_words) / len(answer_words)
+    return overlap >= min_overlap
+
+
+class ModelRouter:
+    """
+    Retrieves the chunks for a query once, then answers with the fast QA chain
+    and escalates to the strong QA chain when the retrieved chunks score low or
+    the fast answer fails the grounding check. Both chains answer from the same chunks.
+    """
+
+    def __init__(
+        self,
+        fast_qa,
+        strong_qa,
+        retriever,
+        relevance,
+        min_relevance=0.75,
+        min_overlap=0.5,
+        metrics=ROUTE_METRICS,
+    ):
+        self.fast_qa = fast_qa
+        self.strong_qa = strong_qa
+        self.retriever = retriever
+        # Returns the relevance score (0 to 1) of a retrieved chunk
+        self.relevance = relevance
+        self.min_relevance = min_relevance
+        self.min_overlap = min_overlap
+        self.metrics = metrics
+        # Chunks behind the last answer, for callers that report sources
+        self.source_documents = []
+
+    def retrieval_confidence(self, docs: List) -> float:
+        """return the best relevance score of the retrieved chunks, 0.0 if there are none"""
+        return max((self.relevance(doc) for doc in docs), default=0.0)
+
+    def _metered(self, route, func, *args):
+        """
+        run func and book its latency and the tokens of the LLM calls it makes
+        under route, so each model's usage is counted on its own route
+        """
+        # Imported here so the metrics can be exposed without loading langchain
+        from langchain.callbacks import get_openai_callback
+
+        start = time.perf_counter()
+        try:
+            with get_openai_callback() as cb:
+                result = func(*args)
+        except Exception:
+            self.metrics.record(route, time.perf_counter() - start, error=True)
+            raise
+        self.metrics.record(
+            route,
+            time.perf_counter() - start,
+            prompt_tokens=cb.prompt_tokens,
+            completion_tokens=cb.completion_tokens,
+        )
+        return result
+
+    def _answer(self, route, qa, query, docs) -> str:
+        result = self._metered(route, qa, {"input_documents": docs, "question": query})
+        return result["output_text"]
+
+    def run(self, query: str) -> str:
+        docs = self._metered(
+            MULTI_QUERY_ROUTE, self.retriever.get_relevant_documents, query
+        )
+        self.source_documents = docs
+
+        confidence = self.retrieval_confidence(docs)
+        if confidence < self.min_relevance:
+            logger.info(
+                f"Retrieval confidence {confidence:.2f} below {self.min_relevance}, "
+                "routing to strong model"
+            )
+            return self._answer(STRONG_ROUTE, self.strong_qa, query, docs)
+
+        try:
+            answer = self._answer(FAST_ROUTE, self.fast_qa, query, docs)
+        except Exception as e:
+            logger.warning(f"Fast model failed, routing to strong model: {e}")
+            return self._answer(STRONG_ROUTE, self.strong_qa, query, docs)
+
+        if not is_grounded(answer, _join_sources(docs), self.min_overlap):
+            logger.info("Fast answer failed grounding check, routing to strong model")
+            return self._answer(STRONG_ROUTE, self.strong_qa, query, docs)
+
+        return answer
+
+
+def _join_sources(docs: List) -> str:
+    return "\n".join(doc.page_content for doc in docs)
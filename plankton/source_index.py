@@ -0,0 +1,175 @@
+from bisect import bisect_left
+from datetime import date
+from typing import Dict, List, Optional
+from plankton.locks import store_lock
+import json
+import os
+import threading
+
+# Written into every index version directory by build_index
+SOURCE_INDEX_FILE = "source_index.json"
+
+# Chroma metadata values must be scalars, so the sources of the duplicates
+# merged into a chunk (see plankton.dedup) are one newline separated string
+ALT_SOURCES_KEY = "alt_sources"
+
+# Filter keys accepted by SourceIndex.select, e.g. from the /ask request body
+FILTER_KEYS = ("source_prefix", "doc_type", "date_from", "date_to")
+
+# Values of the doc_type filter, see document_type
+DOC_TYPES = ("pdf", "page")
+
+
+def document_type(source: Optional[str]) -> str:
+    """return 'pdf' for PDF sources and 'page' for website pages"""
+    path = (source or "").split("?", 1)[0].lower()
+    return "pdf" if path.endswith(".pdf") else "page"
+
+
+def alt_sources(metadata: dict) -> List[str]:
+    """return the sources of the duplicates that were merged into a chunk"""
+    value = metadata.get(ALT_SOURCES_KEY)
+    return value.split("\n") if value else []
+
+
+def parse_filter(metadata_filter) -> Optional[dict]:
+    """
+    validate a metadata filter from a request and return it with its dates
+    in ISO format, raising ValueError for unknown keys or bad values
+    """
+    if not metadata_filter:
+        return None
+    if not isinstance(metadata_filter, dict):
+        raise ValueError("Filter must be an object")
+
+    unknown_keys = [key for key in metadata_filter if key not in FILTER_KEYS]
+    if unknown_keys:
+        raise ValueError(
+            f"Unknown filter keys: {', '.join(map(str, unknown_keys))}. "
+            f"Allowed keys: {', '.join(FILTER_KEYS)}"
+        )
+
+    parsed = {}
+    for key, value in metadata_filter.items():
+        if value is None:
+            continue
+        if not isinstance(value, str):
+            raise ValueError(f"Filter {key} must be a string")
+        if key == "doc_type" and value not in DOC_TYPES:
+            raise ValueError(f"Filter doc_type must be one of {', '.join(DOC_TYPES)}")
+        if key in ("date_from", "date_to"):
+            try:
+                value = date.fromisoformat(value).isoformat()
+            except ValueError:
+                raise ValueError(f"Filter {key} must be an ISO date (YYYY-MM-DD)")
+        parsed[key] = value
+    return parsed or None
+
+
+class SourceIndex:
+    """
+    Precomputed source -> chunk ids map of an index version. Metadata filters
+    are resolved here to a candidate id set, so only those chunks are scored.
+    """
+
+    def __init__(self, sources: Dict[str, dict]):
+        self.sources = sources
+        # Sorted so a source prefix is a contiguous range found with bisect
+        self._sorted_sources = sorted(sources)
+
+    @classmethod
+    def from_metadatas(cls, ids: List[str], metadatas: List[dict]) -> "SourceIndex":
+        sources = {}
+        for chunk_id, metadata in zip(ids, metadatas):
+            metadata = metadata or {}
+            # A deduplicated chunk is listed under every URL it was found at
+            for source in [metadata.get("source") or ""] + alt_sources(metadata):
+                entry = sources.setdefault(
+                    source,
+                    {
+                        "doc_type": document_type(source),
+                        "date": metadata.get("date"),
+                        "ids": [],
+                    },
+                )
+                entry["ids"].append(chunk_id)
+        return cls(sources)
+
+    @classmethod
+    def from_documents(cls, ids: List[str], docs) -> "SourceIndex":
+        return cls.from_metadatas(ids, [doc.metadata for doc in docs])
+
+    @classmethod
+    def from_collection(cls, collection) -> "SourceIndex":
+        """build the index from a Chroma collection, for indexes built before it existed"""
+        results = collection.get(include=["metadatas"])
+        return cls.from_metadatas(results["ids"], results["metadatas"])
+
+    @classmethod
+    def load(cls, directory) -> Optional["SourceIndex"]:
+        try:
+            with open(os.path.join(directory, SOURCE_INDEX_FILE)) as f:
+                return cls(json.load(f))
+        except FileNotFoundError:
+            return None
+
+    def save(self, directory):
+        with open(os.path.join(directory, SOURCE_INDEX_FILE), "w") as f:
+            json.dump(self.sources, f, separators=(",", ":"))
+
+    def select(
+        self, source_prefix=None, doc_type=None, date_from=None, date_to=None
+    ) -> List[str]:
+        """return the ids of the chunks matching every given filter"""
+        sources = self._sorted_sources
+        if source_prefix:
+            start = bisect_left(sources, source_prefix)
+            end = start
+            while end < len(sources) and sources[end].startswith(source_prefix):
+                end += 1
+            sources = sources[start:end]
+
+        ids = []
+        for source in sources:
+            entry = self.sources[source]
+            if doc_type and entry["doc_type"] != doc_type:
+                continue
+            # ISO dates compare correctly as strings, undated sources are excluded.
+            # Only the day of a timestamp is compared, so date_to is inclusive
+            day = (entry.get("date") or "")[:10]
+            if (date_from or date_to) and not day:
+                continue
+            if date_from and day < date_from:
+                continue
+            if date_to and day > date_to:
+                continue
+            ids.extend(entry["ids"])
+        # A chunk listed under several matching sources is returned once
+        return list(dict.fromkeys(ids))
+
+
+_lock = threading.Lock()
+_indexes: Dict[str, SourceIndex] = {}
+
+
+def get_source_index(vectorstore) -> SourceIndex:
+    """
+    return the source index of a Chroma vector store, loaded from its version
+    directory or built from the collection, and kept per collection
+    """
+    collection = vectorstore._collection
+    key = str(collection.id)
+    with _lock:
+        if key not in _indexes:
+            directory = getattr(vectorstore, "_persist_directory", None)
+            index = SourceIndex.load(directory) if directory else None
+            if index is None:
+                with store_lock(vectorstore):
+                    index = SourceIndex.from_collection(collection)
+            _indexes[key] = index
+        return _indexes[key]
+
+
+def clear_source_indexes():
+    with _lock:
+        _indexes.clear()
@@ -0,0 +1,162 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from plankton.routing import ROUTE_METRICS
+from typing import Dict, List, Optional
+import re
+import threading
+import time
+import uuid
+
+TRACE_HEADER = "X-Trace-Id"
+
+# Caller supplied trace IDs end up in Mongo and the logs, so only short
+# IDs made of safe characters (uuid4 hex, W3C trace ids) are reused
+TRACE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+# Upper bounds (seconds) of the stage duration histogram buckets
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar(
+    "plankton_trace", default=None
+)
+
+
+class Trace:
+    """Span timings and counters collected for a single request"""
+
+    def __init__(self, trace_id=None):
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.start = time.perf_counter()
+        self.spans: List[dict] = []
+        self.counters: Dict[str, int] = {}
+
+    def summary(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "duration_seconds": round(time.perf_counter() - self.start, 4),
+            "spans": self.spans,
+            "counters": self.counters,
+        }
+
+
+class MetricsRegistry:
+    """Process wide stage histograms and event counters in Prometheus form"""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self._histograms = {}
+        self._counters = {}
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self._histograms.setdefault(
+                stage, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            )
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["sum"] += seconds
+            histogram["count"] += 1
+
+    def increment(self, event, value=1):
+        with self._lock:
+            self._counters[event] = self._counters.get(event, 0) + value
+
+    def counters(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
+
+    def render(self) -> str:
+        """return the metrics in the Prometheus text exposition format"""
+        with self._lock:
+            lines = [
+                "# HELP plankton_stage_duration_seconds Time spent in each request stage.",
+                "# TYPE plankton_stage_duration_seconds histogram",
+            ]
+            for stage, histogram in sorted(self._histograms.items()):
+                for bound, count in zip(self.buckets, histogram["buckets"]):
+                    lines.append(
+                        f'plankton_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}'
+                    )
+                lines.append(
+                    f'plankton_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram["count"]}'
+                )
+                lines.append(
+                    f'plankton_stage_duration_seconds_sum{{stage="{stage}"}} {histogram["sum"]}'
+                )
+                lines.append(
+                    f'plankton_stage_duration_seconds_count{{stage="{stage}"}} {histogram["count"]}'
+                )
+
+            lines += [
+                "# HELP plankton_events_total Tokens, cache hits, retries and other events.",
+                "# TYPE plankton_events_total counter",
+            ]
+            for event, value in sorted(self._counters.items()):
+                lines.append(f'plankton_events_total{{event="{event}"}} {value}')
+
+        # Calls, errors, latency and tokens per model route, see plankton.routing
+        routes = ROUTE_METRICS.snapshot()
+        keys = sorted({key for stats in routes.values() for key in stats})
+        for key in keys:
+            lines.append(f"# TYPE plankton_route_{key}_total counter")
+            for route, stats in sorted(routes.items()):
+                lines.append(
+                    f'plankton_route_{key}_total{{route="{route}"}} {stats.get(key, 0)}'
+                )
+
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+
+
+def valid_trace_id(trace_id) -> Optional[str]:
+    """return the trace ID if it is safe to reuse, None otherwise"""
+    if trace_id and TRACE_ID_PATTERN.match(trace_id):
+        return trace_id
+    return None
+
+
+def start_trace(trace_id=None) -> Trace:
+    trace = Trace(trace_id)
+    _current_trace.set(trace)
+    return trace
+
+
+def end_trace() -> Optional[Trace]:
+    trace = _current_trace.get()
+    if trace is not None:
+        METRICS.observe("request", time.perf_counter() - trace.start)
+        _current_trace.set(None)
+    return trace
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.trace_id if trace else None
+
+
+def record_span(name, seconds):
+    METRICS.observe(name, seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.spans.append({"name": name, "duration_seconds": round(seconds, 4)})
+
+
+def increment(event, value=1):
+    METRICS.increment(event, value)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.counters[event] = trace.counters.get(event, 0) + value
+
+
+@contextmanager
+def span(name):
+    """time the wrapped block and record it on the current trace"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - start)
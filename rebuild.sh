@@ -1,3 +1,4 @@
-docker run --rm plankton-backend python main.py --delete-existing-db
-docker compose down
-docker compose up -d --build
\ No newline at end of file
+# Build a new index version next to the served one; the backend picks it up
+# on its next question once the build passes validation, without a restart.
+# Roll back with: docker compose run --rm backend python main.py --rollback
+docker compose run --rm backend python main.py --delete-existing-db
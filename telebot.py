@@ -36,12 +36,12 @@ bot.
 import logging
 import os
 from dotenv import load_dotenv
-from telegram import *
-from telegram.ext import *
+from telegram import ForceReply, Update
 from telegram import __version__ as TG_VER
 import requests
 import json
 import datetime
+import uuid
 
 
 try:
@@ -57,6 +57,7 @@ if __version_info__ < (20, 0, 0, "alpha", 1):
     )
 from telegram.ext import (
     Application,
+    CallbackContext,
     CommandHandler,
     ContextTypes,
     MessageHandler,
@@ -79,6 +80,22 @@ logging.getLogger("httpx").setLevel(logging.WARNING)
 
 logger = logging.getLogger(__name__)
 
+# Header used to propagate the per-request trace ID to the backend
+TRACE_HEADER = "X-Trace-Id"
+
+
+def api_headers(trace_id: str) -> dict:
+    """
+    Build the headers for a request to the MOF website chatbot API.
+
+    Args:
+    - trace_id (str): The trace ID that the backend attaches to its spans and logs.
+
+    Returns:
+    - dict: The request headers.
+    """
+    return {"X-API-KEY": os.getenv("API_SECRET_TOKEN"), TRACE_HEADER: trace_id}
+
 
 async def start(update: Update, context: CallbackContext) -> None:
     """
@@ -117,6 +134,7 @@ async def positive(update: Update, context: CallbackContext) -> None:
     user_message = context.args
 
     remarks = " ".join(user_message)
+    trace_id = uuid.uuid4().hex
 
     # Send the user message to the MOF website chatbot API
     response = requests.post(
@@ -131,10 +149,11 @@ async def positive(update: Update, context: CallbackContext) -> None:
             "last_name": update.message.from_user.last_name,
             "date": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         },
-        headers={"X-API-KEY": os.getenv("API_SECRET_TOKEN")},
+        headers=api_headers(trace_id),
         timeout=300,
     )
 
+    logger.info(f"trace: {trace_id}")
     logger.info(response.json())
 
     await update.message.reply_text(f"{response.json()['message']}")
@@ -154,6 +173,7 @@ async def improve(update: Update, context: CallbackContext) -> None:
     user_message = context.args
 
     remarks = " ".join(user_message)
+    trace_id = uuid.uuid4().hex
 
     # Send the user message to the MOF website chatbot API
     response = requests.post(
@@ -168,10 +188,11 @@ async def improve(update: Update, context: CallbackContext) -> None:
             "last_name": update.message.from_user.last_name,
             "date": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         },
-        headers={"X-API-KEY": os.getenv("API_SECRET_TOKEN")},
+        headers=api_headers(trace_id),
         timeout=300,
     )
 
+    logger.info(f"trace: {trace_id}")
     logger.info(response.json())
 
     await update.message.reply_text(f"{response.json()['message']}")
@@ -189,6 +210,7 @@ async def echo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     - None
     """
     message: str = update.message.text
+    trace_id = uuid.uuid4().hex
 
     # Inform user that bot is processing the message
     await update.message.reply_text(
@@ -207,7 +229,7 @@ async def echo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             "last_name": update.message.from_user.last_name,
             "date": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         },
-        headers={"X-API-KEY": os.getenv("API_SECRET_TOKEN")},
+        headers=api_headers(trace_id),
         timeout=300,
     )
 
@@ -220,6 +242,7 @@ async def echo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     except:
         answer = response
 
+    logger.info(f"trace: {trace_id}")
     logger.info(f"asked: {message}")
     logger.info(f"answer: {answer}")
 
@@ -0,0 +1,9 @@
+import os
+
+# Count tokens with the cl100k_base encoding vendored for the benchmark,
+# so the tests never download it
+os.environ["TIKTOKEN_CACHE_DIR"] = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "benchmarks",
+    "tiktoken",
+)
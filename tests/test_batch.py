@@ -0,0 +1,112 @@
+from plankton.batch import answer_batch, answered_ids
+import json
+
+
+def write_lines(path, lines):
+    path.write_text("".join(lines))
+
+
+def test_missing_output_has_no_answers(tmp_path):
+    assert answered_ids(str(tmp_path / "answers.jsonl")) == set()
+
+
+def test_drops_a_truncated_last_line(tmp_path):
+    path = tmp_path / "answers.jsonl"
+    write_lines(
+        path,
+        [
+            json.dumps({"request_id": "r0", "answer": "a"}) + "\n",
+            '{"request_id": "r1", "ans',
+        ],
+    )
+
+    assert answered_ids(str(path)) == {"r0"}
+    assert path.read_text() == json.dumps({"request_id": "r0", "answer": "a"}) + "\n"
+
+
+def test_drops_error_lines_and_duplicate_ids(tmp_path):
+    path = tmp_path / "answers.jsonl"
+    first = json.dumps({"request_id": "r0", "answer": "first"}) + "\n"
+    write_lines(
+        path,
+        [
+            first,
+            json.dumps({"request_id": "r1", "error": "timeout"}) + "\n",
+            json.dumps({"request_id": "r0", "answer": "second"}) + "\n",
+            json.dumps({"request_id": "r1", "error": "timeout"}) + "\n",
+        ],
+    )
+
+    assert answered_ids(str(path)) == {"r0"}
+    assert path.read_text() == first
+
+
+def test_adds_the_missing_final_newline(tmp_path):
+    path = tmp_path / "answers.jsonl"
+    write_lines(path, [json.dumps({"request_id": "r0", "answer": "a"})])
+
+    assert answered_ids(str(path)) == {"r0"}
+    assert path.read_text().endswith("\n")
+
+
+def test_leaves_a_clean_file_untouched(tmp_path):
+    path = tmp_path / "answers.jsonl"
+    write_lines(path, [json.dumps({"request_id": "r0", "answer": "a"}) + "\n"])
+    modified = path.stat().st_mtime_ns
+
+    assert answered_ids(str(path)) == {"r0"}
+    assert path.stat().st_mtime_ns == modified
+
+
+class EchoManager:
+    """Stands in for ChatbotManager, answers with the question"""
+
+    fail = set()
+    source_documents = []
+
+    def __init__(self, vectorstore, metadata_filter=None):
+        self.router = self
+
+    def initialize_agent(self):
+        def agent(question):
+            if question in self.fail:
+                raise RuntimeError("model unavailable")
+            return {"output": question.upper()}
+
+        return agent
+
+
+def test_resume_after_an_interrupted_run(tmp_path):
+    questions = tmp_path / "questions.jsonl"
+    write_lines(
+        questions,
+        [
+            json.dumps({"request_id": f"r{i}", "question": f"question {i}"}) + "\n"
+            for i in range(6)
+        ],
+    )
+    output = tmp_path / "answers.jsonl"
+    write_lines(
+        output,
+        [
+            json.dumps({"request_id": "r0", "answer": "QUESTION 0"}) + "\n",
+            '{"request_id": "r1", "ans',
+        ],
+    )
+
+    EchoManager.fail = {"question 2"}
+    summary = answer_batch(None, str(questions), str(output), 4, EchoManager)
+    assert summary == {"answered": 4, "failed": 1, "skipped": 1}
+
+    EchoManager.fail = set()
+    summary = answer_batch(None, str(questions), str(output), 4, EchoManager)
+    assert summary == {"answered": 1, "failed": 0, "skipped": 5}
+
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert sorted(record["request_id"] for record in records) == [
+        f"r{i}" for i in range(6)
+    ]
+    assert all(
+        record["answer"] == record.get("question", "question 0").upper()
+        for record in records
+    )
@@ -0,0 +1,44 @@
+from langchain.schema import LLMResult
+from plankton.callbacks import RouteCallbackHandler
+from plankton.fakes import StubChatModel
+from plankton.routing import RouteMetrics
+import uuid
+
+
+def test_books_openai_token_usage_under_the_route():
+    metrics = RouteMetrics()
+    handler = RouteCallbackHandler("agent", metrics)
+    run_id = uuid.uuid4()
+    handler.on_chat_model_start({}, [[]], run_id=run_id)
+    handler.on_llm_end(
+        LLMResult(
+            generations=[[]],
+            llm_output={"token_usage": {"prompt_tokens": 120, "completion_tokens": 8}},
+        ),
+        run_id=run_id,
+    )
+
+    stats = metrics.snapshot()["agent"]
+    assert stats["calls"] == 1
+    assert stats["prompt_tokens"] == 120
+    assert stats["completion_tokens"] == 8
+
+
+def test_books_every_call_of_the_llm():
+    metrics = RouteMetrics()
+    llm = StubChatModel(callbacks=[RouteCallbackHandler("agent", metrics)])
+    llm.predict("hello")
+    llm.predict("again")
+
+    assert metrics.snapshot()["agent"]["calls"] == 2
+
+
+def test_books_errors():
+    metrics = RouteMetrics()
+    handler = RouteCallbackHandler("agent", metrics)
+    run_id = uuid.uuid4()
+    handler.on_chat_model_start({}, [[]], run_id=run_id)
+    handler.on_llm_error(RuntimeError("timeout"), run_id=run_id)
+
+    stats = metrics.snapshot()["agent"]
+    assert (stats["calls"], stats["errors"]) == (1, 1)
@@ -0,0 +1,73 @@
+from langchain.docstore.document import Document
+from plankton.corpus import CorpusReader, read_corpus, write_corpus
+from plankton.data_processing import tiktoken_len
+import pytest
+
+
+def round_trip(tmp_path, docs):
+    path = tmp_path / "chunks.plk"
+    write_corpus(str(path), docs)
+    return str(path), read_corpus(str(path))
+
+
+def test_round_trip_keeps_text_metadata_and_tokens(tmp_path):
+    docs = [
+        Document(
+            page_content="Corporate tax applies at 9 percent.",
+            metadata={"id": "mof-001", "source": "https://mof.gov.ae/en/tax"},
+        ),
+        Document(page_content="Value added tax", metadata={"id": "mof-002"}),
+    ]
+    path, loaded = round_trip(tmp_path, docs)
+
+    assert loaded == docs
+    with CorpusReader(path) as reader:
+        assert len(reader) == 2
+        assert [reader.tokens(i) for i in range(2)] == [
+            tiktoken_len(doc.page_content) for doc in docs
+        ]
+        assert reader.total_tokens() == sum(
+            tiktoken_len(doc.page_content) for doc in docs
+        )
+
+
+def test_round_trip_unicode(tmp_path):
+    docs = [
+        Document(
+            page_content="وزارة المالية — ministère des finances 财政部 💰",
+            metadata={"source": "https://mof.gov.ae/ar/صفحة", "title": "é"},
+        )
+    ]
+    _, loaded = round_trip(tmp_path, docs)
+    assert loaded == docs
+
+
+def test_round_trip_empty_text_and_metadata(tmp_path):
+    docs = [
+        Document(page_content="", metadata={}),
+        Document(page_content="between empty chunks", metadata={}),
+        Document(page_content="", metadata={"id": ""}),
+    ]
+    path, loaded = round_trip(tmp_path, docs)
+
+    assert loaded == docs
+    with CorpusReader(path) as reader:
+        assert reader.tokens(0) == 0
+
+
+def test_round_trip_zero_documents(tmp_path):
+    path, loaded = round_trip(tmp_path, [])
+
+    assert loaded == []
+    with CorpusReader(path) as reader:
+        assert len(reader) == 0
+        assert reader.total_tokens() == 0
+        with pytest.raises(IndexError):
+            reader.text(0)
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "not_a_corpus.plk"
+    path.write_bytes(b"\0" * 128)
+    with pytest.raises(ValueError):
+        CorpusReader(str(path))
@@ -0,0 +1,156 @@
+from langchain.docstore.document import Document
+from langchain.embeddings.openai import OpenAIEmbeddings
+from langchain.vectorstores import Chroma
+from plankton import embed_data
+from plankton.embed_data import (
+    build_index,
+    current_version,
+    get_serving_vector_store,
+    get_vector_store,
+    list_versions,
+    previous_version,
+    release_vector_store,
+    rollback_version,
+    TracedOpenAIEmbeddings,
+)
+from plankton.fakes import HashEmbeddings
+from plankton.tracing import end_trace, start_trace
+import os
+import pytest
+import subprocess
+import sys
+
+DOCS = [
+    Document(
+        page_content="Corporate tax applies at 9 percent.", metadata={"source": "a"}
+    ),
+    Document(page_content="Value added tax is 5 percent.", metadata={"source": "b"}),
+]
+
+
+def contents(store):
+    return sorted(store._collection.get()["documents"])
+
+
+def build(persist_directory, docs=DOCS):
+    return build_index(HashEmbeddings(), docs, str(persist_directory))
+
+
+def test_build_swaps_and_keeps_the_previous_version(tmp_path):
+    build(tmp_path)
+    first = current_version(str(tmp_path))
+    build(tmp_path, DOCS[:1])
+    second = current_version(str(tmp_path))
+
+    assert first != second
+    assert previous_version(str(tmp_path)) == first
+    assert list_versions(str(tmp_path)) == [first, second]
+    assert contents(get_vector_store(HashEmbeddings(), str(tmp_path))) == [
+        DOCS[0].page_content
+    ]
+
+
+def test_build_prunes_older_versions(tmp_path):
+    build(tmp_path)
+    build(tmp_path)
+    build(tmp_path)
+
+    assert list_versions(str(tmp_path)) == [
+        previous_version(str(tmp_path)),
+        current_version(str(tmp_path)),
+    ]
+
+
+def test_failed_build_keeps_the_served_version(tmp_path):
+    build(tmp_path)
+    served = current_version(str(tmp_path))
+
+    class BrokenEmbeddings(HashEmbeddings):
+        def embed_query(self, text):
+            raise RuntimeError("embedding service down")
+
+    with pytest.raises(RuntimeError):
+        build_index(BrokenEmbeddings(), DOCS, str(tmp_path))
+    assert current_version(str(tmp_path)) == served
+    assert list_versions(str(tmp_path)) == [served]
+
+
+def test_rollback_is_picked_up_by_the_serving_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(embed_data, "_serving", {"version": None, "vectorstore": None})
+    build(tmp_path)
+    first = current_version(str(tmp_path))
+    build(tmp_path, DOCS[:1])
+    assert contents(get_serving_vector_store(HashEmbeddings(), str(tmp_path))) == [
+        DOCS[0].page_content
+    ]
+
+    assert rollback_version(str(tmp_path)) == first
+    assert contents(
+        get_serving_vector_store(HashEmbeddings(), str(tmp_path))
+    ) == sorted(doc.page_content for doc in DOCS)
+
+
+def test_rollback_without_a_previous_version(tmp_path):
+    build(tmp_path)
+    with pytest.raises(ValueError):
+        rollback_version(str(tmp_path))
+
+
+def test_build_migrates_a_legacy_index(tmp_path):
+    legacy = Chroma.from_documents(
+        DOCS,
+        HashEmbeddings(),
+        persist_directory=str(tmp_path),
+        collection_name=embed_data.DB_COLLECTION,
+    )
+    legacy.persist()
+    release_vector_store(legacy)
+
+    build(tmp_path, DOCS[:1])
+
+    migrated = previous_version(str(tmp_path))
+    assert migrated in list_versions(str(tmp_path))
+    assert not any(name.endswith(".parquet") for name in os.listdir(tmp_path))
+    rollback_version(str(tmp_path))
+    assert contents(get_vector_store(HashEmbeddings(), str(tmp_path))) == sorted(
+        doc.page_content for doc in DOCS
+    )
+
+
+def test_pruned_versions_stay_deleted_after_exit(tmp_path):
+    # Opens the first version, then builds two more so it is pruned
+    script = (
+        "import sys\n"
+        "from plankton.embed_data import build_index, get_vector_store\n"
+        "from plankton.fakes import HashEmbeddings\n"
+        "from langchain.docstore.document import Document\n"
+        "docs = [Document(page_content='tax', metadata={'source': 'a'})]\n"
+        "build_index(HashEmbeddings(), docs, sys.argv[1])\n"
+        "store = get_vector_store(HashEmbeddings(), sys.argv[1])\n"
+        "build_index(HashEmbeddings(), docs, sys.argv[1])\n"
+        "build_index(HashEmbeddings(), docs, sys.argv[1])\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", script, str(tmp_path)], check=True, cwd=root)
+
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        ["CURRENT", "PREVIOUS"] + list_versions(str(tmp_path))
+    )
+    assert len(list_versions(str(tmp_path))) == 2
+
+
+def test_query_embedding_is_traced_once(monkeypatch):
+    monkeypatch.setattr(
+        OpenAIEmbeddings,
+        "embed_documents",
+        lambda self, texts, chunk_size=0: HashEmbeddings().embed_documents(texts),
+    )
+    embeddings = TracedOpenAIEmbeddings(openai_api_key="test")
+    trace = start_trace()
+    try:
+        vector = embeddings.embed_query("corporate tax")
+    finally:
+        end_trace()
+
+    assert vector == HashEmbeddings().embed_query("corporate tax")
+    assert [span["name"] for span in trace.spans] == ["query_embedding"]
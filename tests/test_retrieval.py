@@ -0,0 +1,160 @@
+from concurrent.futures import ThreadPoolExecutor
+from langchain.docstore.document import Document
+from plankton import retrieval
+from plankton.embed_data import build_index
+from plankton.fakes import HashEmbeddings
+from plankton.retrieval import PlanktonRetriever, clear_caches
+import numpy as np
+import pytest
+
+TOPICS = ["tax", "budget", "customs", "excise", "treasury", "audit"]
+
+
+def make_docs():
+    docs = []
+    for i in range(60):
+        topic = TOPICS[i % len(TOPICS)]
+        extension = ".pdf" if i % 5 == 0 else ""
+        docs.append(
+            Document(
+                page_content=f"{topic} guide section {i} covers {topic} rule {i}",
+                metadata={
+                    "source": f"https://mof.gov.ae/en/{topic}/{i}{extension}",
+                    "date": f"2023-{i % 12 + 1:02d}-01",
+                },
+            )
+        )
+    return docs
+
+
+DOCS = make_docs()
+
+
+@pytest.fixture(scope="module")
+def vectorstore(tmp_path_factory):
+    return build_index(HashEmbeddings(), DOCS, str(tmp_path_factory.mktemp("index")))
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    clear_caches()
+    yield
+    clear_caches()
+
+
+def retriever(vectorstore, metadata_filter=None, search_type="similarity", k=3):
+    return PlanktonRetriever(
+        vectorstore=vectorstore,
+        search_type=search_type,
+        search_kwargs={"k": k},
+        metadata_filter=metadata_filter,
+    )
+
+
+def similarity(query, doc):
+    embeddings = HashEmbeddings()
+    return round(
+        float(
+            np.dot(
+                embeddings.embed_query(query), embeddings.embed_query(doc.page_content)
+            )
+        ),
+        6,
+    )
+
+
+def assert_top_k(query, docs, candidates, k=3):
+    """assert docs are k of the candidates most similar to the query, ties in any order"""
+    assert all(doc in candidates for doc in docs)
+    assert [similarity(query, doc) for doc in docs] == sorted(
+        (similarity(query, doc) for doc in candidates), reverse=True
+    )[:k]
+
+
+def contents(docs):
+    return [doc.page_content for doc in docs]
+
+
+def test_unfiltered_search_finds_the_nearest_chunks(vectorstore):
+    query = "customs guide section 14"
+    docs = retriever(vectorstore).get_relevant_documents(query)
+
+    assert_top_k(query, docs, DOCS)
+
+
+def test_small_filter_scores_only_the_selected_chunks(vectorstore):
+    metadata_filter = {"source_prefix": "https://mof.gov.ae/en/tax/"}
+    query = "customs guide section 14"
+    docs = retriever(vectorstore, metadata_filter).get_relevant_documents(query)
+
+    selected = [
+        doc
+        for doc in DOCS
+        if doc.metadata["source"].startswith("https://mof.gov.ae/en/tax/")
+    ]
+    assert_top_k(query, docs, selected)
+
+
+def test_large_filter_searches_hnsw_and_overfetches(vectorstore, monkeypatch):
+    monkeypatch.setattr(retrieval, "MAX_SCAN_CANDIDATES", 0)
+    metadata_filter = {"doc_type": "pdf", "date_from": "2023-06-01"}
+    query = "budget guide rule"
+    docs = retriever(vectorstore, metadata_filter).get_relevant_documents(query)
+
+    selected = [
+        doc
+        for doc in DOCS
+        if doc.metadata["source"].endswith(".pdf")
+        and doc.metadata["date"] >= "2023-06-01"
+    ]
+    assert len(selected) < len(DOCS) / 6
+    assert_top_k(query, docs, selected)
+
+
+def test_mmr_on_both_filter_paths(vectorstore, monkeypatch):
+    metadata_filter = {"source_prefix": "https://mof.gov.ae/en/audit/"}
+    query = "audit rule 11"
+    small = retriever(vectorstore, metadata_filter, "mmr").get_relevant_documents(query)
+
+    clear_caches()
+    monkeypatch.setattr(retrieval, "MAX_SCAN_CANDIDATES", 0)
+    large = retriever(vectorstore, metadata_filter, "mmr").get_relevant_documents(query)
+
+    for docs in (small, large):
+        assert len(docs) == 3
+        assert all(
+            doc.metadata["source"].startswith("https://mof.gov.ae/en/audit/")
+            for doc in docs
+        )
+        # MMR keeps the most similar chunk first
+        assert docs[0].page_content == DOCS[11].page_content
+
+
+def test_filter_without_matches(vectorstore):
+    search = retriever(vectorstore, {"source_prefix": "https://mof.gov.ae/ar/"})
+    assert search.get_relevant_documents("tax") == []
+
+
+def test_relevance_of_returned_chunks(vectorstore):
+    search = retriever(vectorstore, {"doc_type": "page"})
+    docs = search.get_relevant_documents("excise guide section 3")
+
+    assert contents(docs)[0] == DOCS[3].page_content
+    relevances = [search.relevance(doc) for doc in docs]
+    assert relevances == sorted(relevances, reverse=True)
+    assert search.relevance(DOCS[0]) == 0.0
+
+
+def test_concurrent_searches_on_a_shared_store(vectorstore, monkeypatch):
+    monkeypatch.setattr(retrieval, "MAX_SCAN_CANDIDATES", 0)
+    queries = [f"{topic} rule {i}" for i in range(10) for topic in TOPICS]
+
+    def search(query):
+        clear_caches()
+        return contents(
+            retriever(vectorstore, {"doc_type": "page"}).get_relevant_documents(query)
+        )
+
+    expected = [search(query) for query in queries]
+    with ThreadPoolExecutor(8) as pool:
+        assert list(pool.map(search, queries)) == expected
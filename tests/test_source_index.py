@@ -0,0 +1,93 @@
+from plankton.source_index import SourceIndex, parse_filter
+import pytest
+
+METADATAS = [
+    {"source": "https://mof.gov.ae/en/tax", "date": "2023-05-01T10:30:00"},
+    {"source": "https://mof.gov.ae/en/tax", "date": "2023-05-01T10:30:00"},
+    {"source": "https://mof.gov.ae/en/tax/vat.pdf", "date": "2023-06-15"},
+    {"source": "https://mof.gov.ae/en/taxes", "date": "2022-01-01"},
+    {"source": "https://mof.gov.ae/ar/tax"},
+    {
+        "source": "https://mof.gov.ae/en/budget",
+        "date": "2023-07-01",
+        "alt_sources": "https://mof.gov.ae/ar/budget\nhttps://mof.gov.ae/en/tax/budget",
+    },
+]
+
+
+@pytest.fixture
+def index():
+    return SourceIndex.from_metadatas([f"c{i}" for i in range(6)], METADATAS)
+
+
+def test_parse_filter_keeps_valid_filters():
+    assert parse_filter(
+        {"source_prefix": "https://mof.gov.ae/en", "date_to": "2023-05-01"}
+    ) == {"source_prefix": "https://mof.gov.ae/en", "date_to": "2023-05-01"}
+
+
+@pytest.mark.parametrize("metadata_filter", [None, {}, {"doc_type": None}])
+def test_parse_filter_without_restrictions(metadata_filter):
+    assert parse_filter(metadata_filter) is None
+
+
+@pytest.mark.parametrize(
+    "metadata_filter",
+    [
+        ["pdf"],
+        {"language": "en"},
+        {"doc_type": "docx"},
+        {"source_prefix": 42},
+        {"date_from": "01/05/2023"},
+        {"date_to": "2023-02-30"},
+    ],
+)
+def test_parse_filter_rejects_bad_filters(metadata_filter):
+    with pytest.raises(ValueError):
+        parse_filter(metadata_filter)
+
+
+def test_select_by_source_prefix(index):
+    # A prefix, not a path: "tax" also matches "taxes"
+    assert sorted(index.select(source_prefix="https://mof.gov.ae/en/tax")) == [
+        "c0",
+        "c1",
+        "c2",
+        "c3",
+        "c5",
+    ]
+    assert index.select(source_prefix="https://mof.gov.ae/fr") == []
+    assert index.select(source_prefix="https://mof.gov.ae/zz") == []
+
+
+def test_select_by_doc_type(index):
+    assert index.select(doc_type="pdf") == ["c2"]
+    assert "c2" not in index.select(doc_type="page")
+
+
+def test_select_dates_are_inclusive_and_compare_the_day(index):
+    assert index.select(date_from="2023-05-01", date_to="2023-05-01") == ["c0", "c1"]
+    assert sorted(index.select(date_from="2023-06-15")) == ["c2", "c5"]
+    assert index.select(date_to="2022-01-01") == ["c3"]
+
+
+def test_select_excludes_undated_sources_from_date_filters(index):
+    assert "c4" in index.select()
+    assert "c4" not in index.select(date_from="2000-01-01")
+
+
+def test_select_matches_alt_sources_once(index):
+    assert sorted(index.select(source_prefix="https://mof.gov.ae/ar")) == ["c4", "c5"]
+    # Listed under two matching sources, returned once
+    assert index.select(source_prefix="https://mof.gov.ae/").count("c5") == 1
+
+
+def test_save_and_load(index, tmp_path):
+    index.save(str(tmp_path))
+    loaded = SourceIndex.load(str(tmp_path))
+
+    assert loaded.sources == index.sources
+    assert loaded.select(source_prefix="https://mof.gov.ae/en/tax") == index.select(
+        source_prefix="https://mof.gov.ae/en/tax"
+    )
+    assert SourceIndex.load(str(tmp_path / "missing")) is None